@@ -0,0 +1,120 @@
+"""
+AutoResponseMatcher against checking every trigger on its own, with 10k triggers
+
+python benchmarks/auto_response_matching.py [triggers]
+"""
+from common import report, timed
+from random import Random
+import sys
+
+from utils.db.documents.ext.enums import AutoResponseMethod, AutoResponseType
+from utils.db.auto_responses import AutoResponseMatcher, MENTION_PATTERN
+from re import IGNORECASE, Pattern, compile
+from utils.db.documents import AutoResponse
+
+
+def _word(rng: Random) -> str:
+    return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(3, 9)))
+
+
+WORDS = sorted({_word(Random(index)) for index in range(5000)})
+
+
+def auto_responses(count: int, rng: Random) -> list[AutoResponse]:
+    result = []
+
+    for index in range(count):
+        roll = rng.random()
+        regex = False
+
+        if roll < 0.4:
+            method, trigger = AutoResponseMethod.contains, ' '.join(rng.sample(WORDS, rng.randint(1, 2)))
+        elif roll < 0.6:
+            method, trigger = AutoResponseMethod.exact, ' '.join(rng.sample(WORDS, rng.randint(1, 3)))
+        elif roll < 0.8:
+            method, trigger = AutoResponseMethod.regex, rf'{rng.choice(WORDS)}\s+\w+'
+        elif roll < 0.9:
+            method, trigger, regex = AutoResponseMethod.contains, rf'{rng.choice(WORDS)}s?', True
+        else:
+            method, trigger = AutoResponseMethod.mention, str(rng.randint(1, 10**18))
+
+        result.append(AutoResponse.model_construct(
+            id=str(index),
+            method=method,
+            trigger=trigger,
+            response='',
+            type=AutoResponseType.text,
+            data=AutoResponse.AutoResponseData(regex=regex, case_sensitive=rng.random() < 0.2)
+        ))
+
+    return result
+
+
+class NaiveMatcher:
+    def __init__(self, auto_responses: list[AutoResponse]) -> None:
+        """every trigger checked one at a time, regexes compiled up front"""
+        self.checks: list[tuple[str, AutoResponse, Pattern | None]] = []
+
+        for au in auto_responses:
+            flags = 0 if au.data.case_sensitive else IGNORECASE
+            pattern = None
+
+            if au.method == AutoResponseMethod.regex:
+                pattern = compile(au.trigger, flags)
+            elif au.data.regex and au.method == AutoResponseMethod.exact:
+                pattern = compile(rf'\A(?:{au.trigger})\Z', flags)
+            elif au.data.regex and au.method == AutoResponseMethod.contains:
+                pattern = compile(rf'(?<!\S)(?:{au.trigger})(?!\S)', flags)
+
+            self.checks.append((au.id, au, pattern))
+
+    def match(self, content: str) -> set[str]:
+        matches = set()
+        lowered = content.lower()
+        mentions = MENTION_PATTERN.findall(content)
+
+        for _id, au, pattern in self.checks:
+            if pattern is not None:
+                matched = pattern.search(content) is not None
+            else:
+                text = content if au.data.case_sensitive else lowered
+                trigger = au.trigger if au.data.case_sensitive else au.trigger.lower()
+
+                match au.method:
+                    case AutoResponseMethod.exact:
+                        matched = text == trigger
+                    case AutoResponseMethod.contains:
+                        matched = f' {trigger} ' in f' {text} '
+                    case _:
+                        matched = au.trigger in mentions
+
+            if matched:
+                matches.add(_id)
+
+        return matches
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    rng = Random(18)
+    triggers = auto_responses(count, rng)
+    messages = [
+        ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 30)))
+        for _ in range(200)
+    ]
+
+    report(f'build naive, {count} triggers', timed(lambda: NaiveMatcher(triggers)))
+    report(f'build compiled, {count} triggers', timed(lambda: AutoResponseMatcher(triggers).match('')))
+
+    naive, compiled = NaiveMatcher(triggers), AutoResponseMatcher(triggers)
+    matched = sum(len(compiled.match(message)) for message in messages)
+    assert matched == sum(len(naive.match(message)) for message in messages)
+    print(f'{len(messages)} messages, {matched} matches')
+
+    baseline = timed(lambda: [naive.match(message) for message in messages])/len(messages)
+    report('match naive, per message', baseline)
+    report('match compiled, per message', timed(lambda: [compiled.match(message) for message in messages], 5)/len(messages), baseline)
+
+
+if __name__ == '__main__':
+    main()
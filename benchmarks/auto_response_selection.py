@@ -0,0 +1,47 @@
+"""
+AutoResponseSelector against picking by weight, rolling chance and rerolling on failure
+
+python benchmarks/auto_response_selection.py
+"""
+from common import report, timed
+from random import Random
+
+from utils.db.documents.ext.enums import AutoResponseMethod, AutoResponseType
+from utils.db.auto_responses import AutoResponseSelector
+from utils.db.documents import AutoResponse
+
+
+def reroll_select(auto_responses: list[AutoResponse], rng: Random) -> AutoResponse:
+    weights = [au.data.weight for au in auto_responses]
+
+    while True:
+        au = rng.choices(auto_responses, weights)[0]
+
+        if rng.random()*100 < au.data.chance:
+            return au
+
+
+def main() -> None:
+    rng = Random(21)
+
+    for candidates, chance in ((3, 100.0), (30, 10.0), (30, 0.5)):
+        auto_responses = [
+            AutoResponse.model_construct(
+                id=str(index),
+                method=AutoResponseMethod.contains,
+                trigger='hi',
+                response='',
+                type=AutoResponseType.text,
+                data=AutoResponse.AutoResponseData(weight=rng.randint(1, 2000), chance=chance)
+            )
+            for index in range(candidates)
+        ]
+        selector = AutoResponseSelector()
+        print(f'{candidates} candidates, {chance}% chance')
+        baseline = timed(lambda: reroll_select(auto_responses, rng), 2000)
+        report('  reroll', baseline)
+        report('  alias table', timed(lambda: selector.select(auto_responses, rng), 2000), baseline)
+
+
+if __name__ == '__main__':
+    main()
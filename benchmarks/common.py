@@ -0,0 +1,83 @@
+from typing import Any, AsyncIterator, Callable, Awaitable
+from contextlib import asynccontextmanager
+from time import perf_counter
+from pathlib import Path
+from types import ModuleType
+from os import environ
+import sys
+
+
+# ? the repository is the utils package of the bot, make it importable as such without installing it
+if 'utils' not in sys.modules:
+    utils = ModuleType('utils')
+    utils.__path__ = [str(Path(__file__).resolve().parents[1])]
+    sys.modules['utils'] = utils
+
+
+def timed(function: Callable[[], Any], number: int = 1) -> float:
+    """seconds per call of function"""
+    start = perf_counter()
+
+    for _ in range(number):
+        function()
+
+    return (perf_counter()-start)/number
+
+
+async def timed_async(function: Callable[[], Awaitable[Any]], number: int = 1) -> float:
+    """seconds per call of an async function"""
+    start = perf_counter()
+
+    for _ in range(number):
+        await function()
+
+    return (perf_counter()-start)/number
+
+
+def report(name: str, seconds: float, baseline: float | None = None) -> None:
+    line = f'{name:<48} {seconds*1e6:>12.1f} us'
+
+    if baseline is not None:
+        line += f' {baseline/seconds:>8.1f}x'
+
+    print(line)
+
+
+@asynccontextmanager
+async def database() -> AsyncIterator[Any]:
+    """
+    a connected MongoDatabase on MONGO_URI, or on an in-memory stand-in (mongomock_motor) without one
+
+    MONGO_URI should point to a throwaway server, benchmarks write to and drop collections of its regnal database
+    """
+    import utils.db as db
+
+    if (uri := environ.get('MONGO_URI')) is None:
+        from mongomock_motor import AsyncMongoMockClient
+
+        db.AsyncIOMotorClient = lambda *args, **kwargs: AsyncMongoMockClient()
+        uri = 'mongodb://stand-in'
+
+    mongo = db.MongoDatabase(uri)
+    await mongo.connect()
+
+    try:
+        yield mongo
+    finally:
+        await mongo.close()
+
+
+class RoundTrips:
+    def __init__(self, collection: Any, methods: tuple[str, ...] = ('find', 'find_one')) -> None:
+        """counts calls of collection methods, each is one round trip for the lookups benchmarked here"""
+        self.count = 0
+
+        for method in methods:
+            setattr(collection, method, self._counted(getattr(collection, method)))
+
+    def _counted(self, method: Callable) -> Callable:
+        def counted(*args, **kwargs) -> Any:
+            self.count += 1
+            return method(*args, **kwargs)
+
+        return counted
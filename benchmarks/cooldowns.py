@@ -0,0 +1,72 @@
+"""
+CooldownTracker at one million active keys, against a dict swept for expired entries
+
+python benchmarks/cooldowns.py [keys]
+"""
+from common import report, timed
+from tracemalloc import get_traced_memory, start, stop
+from random import Random
+from time import monotonic
+import sys
+
+from utils.db.documents.ext.enums import AUCooldownMode
+from utils.db.cooldowns import CooldownTracker
+
+
+class SweptCooldowns:
+    def __init__(self, sweep_every: int = 10_000) -> None:
+        """last fired times in a dict, expired entries removed by a full sweep every sweep_every checks"""
+        self.sweep_every = sweep_every
+        self._expiries: dict[tuple[int, int, int], float] = {}
+        self._checks = 0
+
+    def check_and_set(self, guild: int, mode: AUCooldownMode, scope: int | None, cooldown: float) -> bool:
+        now = monotonic()
+        self._checks += 1
+
+        if self._checks % self.sweep_every == 0:
+            self._expiries = {key: expiry for key, expiry in self._expiries.items() if expiry > now}
+
+        key = (guild, mode.value, scope or 0)
+
+        if (expiry := self._expiries.get(key)) is not None and expiry > now:
+            return False
+
+        self._expiries[key] = now+cooldown
+        return True
+
+
+def fill(tracker: CooldownTracker | SweptCooldowns, keys: int) -> None:
+    for index in range(keys):
+        tracker.check_and_set(index % 5000, AUCooldownMode.user, index, 3600)
+
+
+def main() -> None:
+    keys = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    rng = Random(24)
+
+    start()
+    tracker = CooldownTracker(max_keys=keys)
+    fill(tracker, keys)
+    print(f'{len(tracker)} active keys, {get_traced_memory()[0]/1024/1024:.0f} MiB')
+    stop()
+
+    swept = SweptCooldowns()
+    fill(swept, keys)
+    operations = 100_000
+
+    def active(tracker: CooldownTracker | SweptCooldowns) -> bool:
+        index = rng.randrange(keys)
+        return tracker.check_and_set(index % 5000, AUCooldownMode.user, index, 3600)
+
+    for name, check in (
+        ('active key, dict with sweeps', lambda: active(swept)),
+        ('active key, heap', lambda: active(tracker)),
+        ('new key at max_keys, heap', lambda: tracker.check_and_set(1, AUCooldownMode.channel, rng.randrange(10**12), 3600)),
+        ('guild cooldown, heap', lambda: tracker.check_and_set(rng.randrange(5000), AUCooldownMode.guild, None, 3600))
+    ):
+        report(name, timed(check, operations))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""
+bytes transferred and time per call of full guild() lookups against guild_view() projections
+
+python benchmarks/guild_views.py, set MONGO_URI to run against a local mongod instead of the in-memory stand-in
+"""
+from common import database, report, timed, timed_async
+from asyncio import run
+from random import Random
+from bson import BSON
+
+from utils.db.views import _path_adapter, _walk
+
+
+GUILD_ID = 10**6
+PATHS = ('config.auto_responses', 'data.auto_responses.whitelist', 'data.auto_responses.blacklist', 'config.general.timezone')
+
+
+async def main() -> None:
+    async with database() as mongo:
+        from utils.db import Guild
+
+        rng = Random(6)
+        guild = mongo.new.guild(GUILD_ID, 'benchmark', None)
+        # ? a long running guild, the maps hot paths don't need are what makes it large
+        guild.data.leaderboards = {
+            board: {str(rng.randrange(10**18)): rng.randrange(10**6) for _ in range(5000)}
+            for board in ('messages', 'sticks', 'emojis')
+        }
+        guild.data.activity = {
+            str(day): {str(rng.randrange(10**18)): rng.randrange(1000) for _ in range(300)}
+            for day in range(30)
+        }
+        guild.data.qotd.asked = {str(day): f'question {day}' for day in range(1000)}
+        await guild.insert()
+
+        raw = await Guild.get_motor_collection().find_one({'_id': GUILD_ID})
+        view = await mongo.guild_view(GUILD_ID, *PATHS, ignore_cache=True)
+        print(f'full document {len(BSON.encode(raw)):>10} bytes')
+        print(f'view          {view.nbytes:>10} bytes')
+
+        baseline = await timed_async(lambda: mongo.guild(GUILD_ID, ignore_cache=True), 20)
+        report('guild(), per call', baseline)
+        report('guild_view(), per call', await timed_async(lambda: mongo.guild_view(GUILD_ID, *PATHS, ignore_cache=True), 20), baseline)
+        projected = await Guild.get_motor_collection().find_one({'_id': GUILD_ID}, projection=dict.fromkeys(PATHS, 1))
+        validation = timed(lambda: Guild.model_validate(raw), 20)
+        report('validation only, full document', validation)
+        report('validation only, view', timed(lambda: _validate_view(Guild, projected), 200), validation)
+
+        await Guild.get_motor_collection().delete_one({'_id': GUILD_ID})
+
+
+def _validate_view(document: type, raw: dict) -> None:
+    for path in PATHS:
+        _path_adapter(document, path)[0].validate_python(_walk(raw, path))
+
+
+if __name__ == '__main__':
+    run(main())
@@ -0,0 +1,67 @@
+"""
+time per page of MongoDatabase.logs keyset pagination against skip/limit, over a synthetic log collection
+
+python benchmarks/log_pages.py [rows], set MONGO_URI to run against a local mongod instead of the in-memory stand-in,
+the stand-in scans every document per query so it defaults to 20k rows instead of 2 million
+"""
+from common import database
+from datetime import datetime, timedelta
+from os import environ
+from time import perf_counter
+from random import Random
+from asyncio import run
+import sys
+
+
+# ? far outside real discord ids
+BASE_ID = 10**6
+GUILDS = 10
+PAGE = 100
+
+
+async def main() -> None:
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000 if 'MONGO_URI' in environ else 20_000
+
+    async with database() as mongo:
+        from utils.db import Log
+
+        collection = Log.get_motor_collection()
+        rng, start = Random(15), datetime(2024, 1, 1)
+
+        for offset in range(0, rows, 10_000):
+            await collection.insert_many([
+                {
+                    '_id': BASE_ID+index,
+                    'guild': BASE_ID+index % GUILDS,
+                    'channel': BASE_ID+rng.randrange(50),
+                    'author': BASE_ID+rng.randrange(5000),
+                    'kind': rng.choice(['message', 'deleted_message', 'edited_message']),
+                    'timestamp': start+timedelta(seconds=index),
+                    'data': {'content': 'x'*rng.randrange(200)}
+                }
+                for index in range(offset, min(offset+10_000, rows))
+            ], ordered=False)
+
+        guild = BASE_ID
+        pages = rows//GUILDS//PAGE
+        print(f'{rows} logs, {pages} pages of {PAGE} in the benchmarked guild')
+
+        for depth in sorted({1, pages//10, pages//2, pages-1} - {0}):
+            start_time = perf_counter()
+            await Log.find({'guild': guild}, ignore_cache=True).sort([('timestamp', -1), ('_id', -1)]).skip(depth*PAGE).limit(PAGE).to_list()
+            skip = perf_counter()-start_time
+
+            # ? the cursor of the log before the page, as the log viewer would have it
+            before = await collection.find({'guild': guild}).sort([('timestamp', -1), ('_id', -1)]).skip(depth*PAGE-1).limit(1).to_list(None)
+            start_time = perf_counter()
+            page = [log async for log in mongo.logs(guild, cursor=(before[0]['timestamp'], before[0]['_id']), limit=PAGE)]
+            keyset = perf_counter()-start_time
+
+            assert len(page) == PAGE or depth == pages-1
+            print(f'page {depth:>6}   skip/limit {skip*1000:>9.1f} ms   keyset {keyset*1000:>9.1f} ms')
+
+        await collection.delete_many({'_id': {'$gte': BASE_ID, '$lt': BASE_ID+rows}})
+
+
+if __name__ == '__main__':
+    run(main())
@@ -0,0 +1,43 @@
+"""
+round trips and lookups per second of bursts of user lookups, one find_one each against coalesced and batched lookups
+
+python benchmarks/lookups.py, set MONGO_URI to run against a local mongod instead of the in-memory stand-in
+"""
+from common import RoundTrips, database
+from asyncio import gather, run
+from time import perf_counter
+from random import Random
+
+
+# ? far outside real discord ids
+BASE_ID = 10**6
+
+async def main() -> None:
+    async with database() as mongo:
+        from utils.db import User
+
+        collection = User.get_motor_collection()
+        ids = range(BASE_ID, BASE_ID+1000)
+        await collection.insert_many([{'_id': _id, 'username': str(_id)} for _id in ids])
+        round_trips = RoundTrips(collection)
+        rng = Random(1)
+        # ? a burst of 2000 lookups over 200 active users, like a busy channel
+        burst = [rng.choice(ids[:200]) for _ in range(2000)]
+
+        for name, lookup in (
+            ('find_one per lookup (before)', lambda: gather(*(User.find_one({'_id': _id}, ignore_cache=True) for _id in burst))),
+            ('user(), coalesced', lambda: gather(*(mongo.user(_id, ignore_cache=True) for _id in burst))),
+            ('users_many(), batched', lambda: mongo.users_many(burst))
+        ):
+            mongo.cache.clear()
+            round_trips.count = 0
+            start = perf_counter()
+            await lookup()
+            seconds = perf_counter()-start
+            print(f'{name:<32} {round_trips.count:>6} round trips {len(burst)/seconds:>10.0f} lookups/s')
+
+        await collection.delete_many({'_id': {'$in': list(ids)}})
+
+
+if __name__ == '__main__':
+    run(main())
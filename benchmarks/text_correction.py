@@ -0,0 +1,47 @@
+"""
+TextCorrector against applying every correction on its own, with several thousand corrections
+
+python benchmarks/text_correction.py [corrections]
+"""
+from common import report, timed
+from re import IGNORECASE, compile, escape
+from random import Random
+import sys
+
+from utils.db.text_correction import TextCorrector
+
+
+def word(rng: Random) -> str:
+    return ''.join(rng.choice('abcdefghijklmnopqrstuvwxyz') for _ in range(rng.randint(2, 10)))
+
+
+def main() -> None:
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    rng = Random(10)
+    corrections = {word(rng): word(rng) for _ in range(count)}
+    words = list(corrections)+[word(rng) for _ in range(count)]
+    messages = [
+        ' '.join(rng.choice(words) for _ in range(rng.randint(3, 40)))
+        for _ in range(100)
+    ]
+
+    patterns = [
+        (compile(rf'(?<!\w){escape(word)}(?!\w)', IGNORECASE), correction)
+        for word, correction in corrections.items()
+    ]
+
+    def one_at_a_time(text: str) -> str:
+        for pattern, correction in patterns:
+            text = pattern.sub(correction, text)
+
+        return text
+
+    report(f'build, {count} corrections', timed(lambda: TextCorrector(corrections)))
+    corrector = TextCorrector(corrections)
+    baseline = timed(lambda: [one_at_a_time(message) for message in messages])/len(messages)
+    report('one correction at a time, per message', baseline)
+    report('compiled, per message', timed(lambda: [corrector.correct(message) for message in messages], 10)/len(messages), baseline)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,54 @@
+"""
+time to first audio of chunked TTS cache entries, stream() against reading the whole entry with get()
+
+MONGO_URI=mongodb://localhost python benchmarks/tts_first_audio.py,
+needs a real server (ideally a throwaway one), the in-memory stand-in has no gridfs support
+"""
+from common import database
+from tempfile import TemporaryDirectory
+from time import perf_counter
+from os import environ, urandom
+from asyncio import run
+import sys
+
+
+async def main() -> None:
+    if 'MONGO_URI' not in environ:
+        sys.exit('MONGO_URI is required, chunked storage uses gridfs')
+
+    async with database() as mongo:
+        from utils.db.tts import TTSAudioCache
+        from utils.db import TTSCache
+
+        for megabytes in (2, 8, 32):
+            key = f'benchmark:{megabytes}'
+
+            with TemporaryDirectory() as disk_path:
+                writer = TTSAudioCache(mongo.tts_cache, disk_path=disk_path)
+                await writer.put(key, urandom(megabytes*1024*1024))
+
+            # ? fresh caches, so every read comes from mongo
+            with TemporaryDirectory() as disk_path:
+                start = perf_counter()
+                await TTSAudioCache(mongo.tts_cache, disk_path=disk_path).get(key)
+                whole = perf_counter()-start
+
+            with TemporaryDirectory() as disk_path:
+                start = perf_counter()
+                stream = TTSAudioCache(mongo.tts_cache, disk_path=disk_path).stream(key)
+                await anext(stream)
+                first = perf_counter()-start
+
+                async for _ in stream:
+                    pass
+
+                complete = perf_counter()-start
+
+            print(f'{megabytes:>3} MiB   get() {whole*1000:>8.1f} ms   stream() first chunk {first*1000:>8.1f} ms, complete {complete*1000:>8.1f} ms')
+
+            await writer.chunks.delete(key)
+            await TTSCache.get_motor_collection().delete_one({'_id': key})
+
+
+if __name__ == '__main__':
+    run(main())
@@ -5,8 +5,27 @@ from typing import Optional
 
 
 class RequestReloadAU(Request):
+    class Data(BaseModel):
+        added: list[str] = Field(
+            default=[],
+            description='ids of added auto responses'
+        )
+        changed: list[str] = Field(
+            default=[],
+            description='ids of changed auto responses'
+        )
+        deleted: list[str] = Field(
+            default=[],
+            description='ids of deleted auto responses'
+        )
+
+        @property
+        def full(self) -> bool:
+            """no ids means every auto response should be reloaded"""
+            return not (self.added or self.changed or self.deleted)
+
     req: GatewayRequestType = GatewayRequestType.RELOAD_AU
-    data: dict = {}
+    data: Data = Field(default=Data(), description='request data')
 
 
 class RequestSendMessage(Request):
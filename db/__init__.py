@@ -1,9 +1,27 @@
-from .documents import User, Guild, AutoResponse, AutoResponseFileMask, Log, QOTDResponseMetric, ModMail, TTSCache
-from .documents.inf import Inf, INFTextCorrection, INFExcuses, INFInsults, INFEightBall, INFBees
-from .documents.ext.enums import AutoResponseMethod
+from .documents import User, Guild, AutoResponse, AutoResponseFileMask, Log, QOTDResponseMetric, ModMail, TTSCache, Activity
+from .documents.inf import Inf, INFBase, INFTextCorrection, INFExcuses, INFInsults, INFEightBall, INFBees
+from .documents.ext.enums import AutoResponseMethod, AutoResponseType
+from .auto_responses import AutoResponseMatchers, AutoResponseReloader, AutoResponseMasks
+from .cache import DocumentCache, DocumentSnapshot, ChangeStreamInvalidator, BloomFilter
+from beanie import init_beanie, PydanticObjectId, Document
+from typing import AsyncIterator, Iterable, TypeVar, Any
 from motor.motor_asyncio import AsyncIOMotorClient
 from pymongo.database import Database as _Database
-from beanie import init_beanie, PydanticObjectId
+from .batch import InFlight, DocumentBatcher
+from beanie.odm.utils.dump import get_dict
+from .views import DocumentView, find_view
+from .documents.ext.hooks import on_insert
+from asyncio import Task, get_running_loop
+from .counters import CounterAggregator
+from .activity import ActivityStore
+from .tts import TTSAudioCache, TTSRetention
+from pymongo import ReturnDocument, DESCENDING
+from datetime import datetime
+from .recent import RecentMessages
+from .logs import LogIngestor
+
+
+D = TypeVar('D', bound=Document)
 
 
 class _MongoNew:
@@ -24,8 +42,15 @@ class _MongoNew:
         return AutoResponseFileMask(au=au)
 
     @staticmethod
-    def log(id: int, data: dict) -> Log:
-        return Log(id=id, data=data)
+    def log(
+        id: int,
+        data: dict,
+        guild: int | None = None,
+        channel: int | None = None,
+        author: int | None = None,
+        kind: str | None = None
+    ) -> Log:
+        return Log(id=id, data=data, guild=guild, channel=channel, author=author, kind=kind)
 
     @staticmethod
     def tts_cache(id: int, data: bytes) -> TTSCache:
@@ -33,9 +58,47 @@ class _MongoNew:
 
 
 class MongoDatabase:
+    _shared: dict[str, tuple[InFlight, DocumentCache, ChangeStreamInvalidator]] = {}
+    _tts_audio: dict[str, TTSAudioCache] = {}
+    _watched_documents = [User, Guild, AutoResponse, AutoResponseFileMask, QOTDResponseMetric, ModMail, Log, TTSCache, INFBase]
+
     def __init__(self, mongo_uri: str) -> None:
         self._client: _Database = AsyncIOMotorClient(
             mongo_uri, serverSelectionTimeoutMS=5000)['regnal']
+        self._mongo_uri = mongo_uri
+        self._inflight, self.cache, self._invalidator = self._shared_state(mongo_uri)
+        self._user_batcher = DocumentBatcher(User, self._inflight)
+        self._guild_batcher = DocumentBatcher(Guild, self._inflight)
+        self._au_mask_batcher = DocumentBatcher(AutoResponseFileMask, self._inflight)
+        self.counters = CounterAggregator()
+        self.activity = ActivityStore(self.counters)
+        self.recent_messages = RecentMessages()
+        self.au_matchers = AutoResponseMatchers()
+        self.au_reloader = AutoResponseReloader(self.au_matchers, self._fetch_auto_responses)
+        self.au_masks = AutoResponseMasks()
+        self.au_reloader.on_reload.append(self.au_masks.reload)
+        self.log_ingestor = LogIngestor(recent=self.recent_messages)
+        self._inf = Inf()
+        self._tasks: set[Task] = set()
+
+    def _shared_state(self, mongo_uri: str) -> tuple[InFlight, DocumentCache, ChangeStreamInvalidator]:
+        """every client in the process connected to the same uri shares lookups, cache and change stream"""
+        if mongo_uri not in self._shared:
+            client = self._client
+            cache = DocumentCache()
+            cache.negative.ttls.update({'logs': 60.0, 'tts_cache': 60.0})
+            on_insert(cache.inserted)
+            self._shared[mongo_uri] = (
+                InFlight(),
+                cache,
+                ChangeStreamInvalidator(
+                    cache,
+                    lambda: client.watch(ChangeStreamInvalidator.pipeline(self._watched_documents)),
+                    on_connect=self._reload_existence_filters
+                )
+            )
+
+        return self._shared[mongo_uri]
 
     async def connect(self) -> None:
         await init_beanie(self._client, document_models=[
@@ -51,72 +114,399 @@ class MongoDatabase:
             INFInsults,
             INFEightBall,
             INFBees,
-            TTSCache
+            TTSCache,
+            Activity
         ])
 
+        await self._inf.load()
+        self._invalidator.listen(INFBase.Settings.name, self._on_inf_change)
+        self._invalidator.listen(Log.Settings.name, self._on_log_change)
+        self._invalidator.listen(AutoResponse.Settings.name, self._on_au_change)
+        self._invalidator.on_connect.append(self._inf.load)
+        await self.au_masks.load()
+        self._invalidator.listen(AutoResponseFileMask.Settings.name, self.au_masks.handle)
+        self._invalidator.on_connect.append(self.au_masks.load)
+        self.counters.start()
+        self.log_ingestor.start()
+        self._invalidator.start()
+
+    async def close(self) -> None:
+        """flush pending writes, should be called on shutdown"""
+        self._invalidator.unlisten(INFBase.Settings.name, self._on_inf_change)
+        self._invalidator.unlisten(Log.Settings.name, self._on_log_change)
+        self._invalidator.unlisten(AutoResponse.Settings.name, self._on_au_change)
+        self._invalidator.unlisten(AutoResponseFileMask.Settings.name, self.au_masks.handle)
+
+        if self._inf.load in self._invalidator.on_connect:
+            self._invalidator.on_connect.remove(self._inf.load)
+
+        if self.au_masks.load in self._invalidator.on_connect:
+            self._invalidator.on_connect.remove(self.au_masks.load)
+
+        self._invalidator.stop()
+        self.au_reloader.close()
+        closers = [self.counters.close, self.log_ingestor.close]
+
+        if (
+            (tts_audio := self._tts_audio.get(self._mongo_uri)) is not None and
+            tts_audio.retention is not None
+        ):
+            closers.append(tts_audio.retention.close)
+
+        error: Exception | None = None
+
+        # ? a failing close doesn't stop the others from writing what they hold
+        for close in closers:
+            try:
+                await close()
+            except Exception as e:
+                error = error or e
+
+        if error is not None:
+            raise error
+
+    def _on_inf_change(self, change: dict) -> None:
+        task = get_running_loop().create_task(self._inf.load())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    def _on_log_change(self, change: dict) -> None:
+        if change['operationType'] != 'insert':
+            self.recent_messages.discard(change['documentKey']['_id'])
+
+    def _on_au_change(self, change: dict) -> None:
+        if change['operationType'] == 'update':
+            description = change.get('updateDescription', {})
+            fields = [*description.get('updatedFields', {}), *description.get('removedFields', [])]
+
+            # ? trigger counts change every time an auto response is used and don't affect matching
+            if fields and all(field.split('.')[0] == 'statistics' for field in fields):
+                return
+
+        if change['operationType'] == 'delete':
+            self.au_reloader.request(deleted=[change['documentKey']['_id']])
+            return
+
+        self.au_reloader.request(changed=[change['documentKey']['_id']])
+
+    async def _fetch_auto_responses(self, ids: list[str]) -> list[AutoResponse]:
+        for _id in ids:
+            self.cache.invalidate(AutoResponse.Settings.name, _id)
+
+        return [auto_response async for auto_response in self._stream_auto_responses({'_id': {'$in': ids}})]
+
     @property
     def new(self) -> _MongoNew:
         return _MongoNew
 
+    @property
+    def tts_audio(self) -> TTSAudioCache:
+        """tiered tts audio cache, shared by every client in the process, created on first use"""
+        if self._mongo_uri not in self._tts_audio:
+            self._tts_audio[self._mongo_uri] = TTSAudioCache(self.tts_cache)
+
+        return self._tts_audio[self._mongo_uri]
+
+    def start_tts_retention(self, max_bytes: int = 4*1024*1024*1024) -> TTSRetention:
+        """cap tts_cache at max_bytes, should only be started by one client"""
+        if (retention := self.tts_audio.retention) is None:
+            retention = self.tts_audio.retention = TTSRetention(self.tts_audio.chunks, max_bytes)
+            retention.start()
+
+        return retention
+
     @property
     def inf(self) -> Inf:
-        return Inf
+        """in memory inf documents, reloaded when the inf collection changes"""
+        return self._inf
 
-    async def user(self, _id: int | str, ignore_cache: bool = False, create_if_not_found: bool = False) -> User | None:
-        """user documents"""
-        user = await User.find_one({'_id': _id}, ignore_cache=ignore_cache)
-        if user is not None:
-            return user
+    async def load_existence_filter(self, document: type[Document], capacity: int, error_rate: float = 0.01) -> None:
+        """
+        load every id of a collection into a bloom filter so lookups of missing ids skip the database
+
+        intended for high cardinality collections like Log and TTSCache,
+        the filter is only used while the change stream is connected and is rebuilt on reconnect
+        """
+        bloom = BloomFilter(capacity, error_rate)
+        # ? registered before loading so inserts during the scan are not missed
+        self.cache.filters[document.Settings.name] = bloom
+
+        async for raw in document.get_motor_collection().find({}, {'_id': 1}):
+            bloom.add(raw['_id'])
+
+        bloom.ready = True
+
+    async def _reload_existence_filters(self) -> None:
+        documents = {document.Settings.name: document for document in self._watched_documents}
+
+        for name, bloom in list(self.cache.filters.items()):
+            await self.load_existence_filter(documents[name], bloom.capacity, bloom.error_rate)
+
+    async def _find(self, document: type[D], _id: Any, ignore_cache: bool = False) -> D | None:
+        if not ignore_cache:
+            if (snapshot := self.cache.get(document, _id)) is not None:
+                return snapshot.load()
+
+            if self.cache.is_missing(document, _id):
+                return None
+
+        async def find() -> DocumentSnapshot[D] | None:
+            raw = await document.get_motor_collection().find_one({'_id': _id})
+            return None if raw is None else DocumentSnapshot(document, raw)
+
+        self.cache.begin(document, _id)
+        snapshot, completed = None, False
+
+        try:
+            snapshot = await self._inflight.run((document.Settings.name, _id), find)
+            completed = True
+        finally:
+            self.cache.end(document, _id, snapshot, completed=completed)
+
+        return None if snapshot is None else snapshot.load()
+
+    async def _find_many(self, document: type[D], batcher: DocumentBatcher, ids: Iterable[Any]) -> dict[Any, D | None]:
+        snapshots = {_id: self.cache.get(document, _id) for _id in ids}
+        missing = [
+            _id for _id, snapshot in snapshots.items()
+            if snapshot is None and not self.cache.is_missing(document, _id)
+        ]
+
+        for _id in missing:
+            self.cache.begin(document, _id)
 
-        if not create_if_not_found:
+        found, completed = {}, False
+
+        try:
+            found = await batcher.get_many(missing)
+            completed = True
+        finally:
+            for _id in missing:
+                self.cache.end(document, _id, found.get(_id), completed=completed)
+
+        snapshots.update(found)
+
+        return {
+            _id: None if snapshot is None else snapshot.load()
+            for _id, snapshot in snapshots.items()
+        }
+
+    async def _find_or_create(self, document: type[D], template: D, ignore_cache: bool = False) -> D:
+        """find a document or insert template in one round trip, safe against concurrent inserts"""
+        _id = template.id
+
+        if not ignore_cache and (snapshot := self.cache.get(document, _id)) is not None:
+            return snapshot.load()
+
+        defaults = get_dict(template, to_db=True)
+        defaults.pop('_id')
+
+        async def upsert() -> DocumentSnapshot[D]:
+            return DocumentSnapshot(
+                document,
+                await document.get_motor_collection().find_one_and_update(
+                    {'_id': _id},
+                    {'$setOnInsert': defaults},
+                    upsert=True,
+                    return_document=ReturnDocument.AFTER
+                )
+            )
+
+        self.cache.begin(document, _id)
+        snapshot, completed = None, False
+
+        try:
+            snapshot = await self._inflight.run((document.Settings.name, _id, 'upsert'), upsert)
+            completed = True
+        finally:
+            self.cache.end(document, _id, snapshot, completed=completed)
+
+        self.cache.inserted(document.Settings.name, _id)
+        return snapshot.load()
+
+    async def _find_uncached(self, document: type[D], _id: Any, ignore_cache: bool = False) -> D | None:
+        """find through the beanie cache, only remembering misses"""
+        if not ignore_cache and self.cache.is_missing(document, _id):
             return None
 
-        user = self.new.user(_id, '')
-        await user.insert()
+        self.cache.begin(document, _id)
+        doc, completed = None, False
 
-        return user
+        try:
+            doc = await document.find_one({'_id': _id}, ignore_cache=ignore_cache)
+            completed = True
+        finally:
+            self.cache.end(document, _id, doc, store=False, completed=completed)
+
+        return doc
+
+    async def user(self, _id: int | str, ignore_cache: bool = False, create_if_not_found: bool = False) -> User | None:
+        """user documents"""
+        if create_if_not_found:
+            return await self._find_or_create(User, self.new.user(_id, ''), ignore_cache)
+
+        return await self._find(User, _id, ignore_cache)
 
     async def guild(self, _id: int | str, ignore_cache: bool = False, create_if_not_found: bool = False) -> Guild | None:
         """guild documents"""
-        guild = await Guild.find_one({'_id': _id}, ignore_cache=ignore_cache)
+        if create_if_not_found:
+            return await self._find_or_create(Guild, self.new.guild(_id, '', None), ignore_cache)
 
-        if guild is not None:
-            return guild
+        return await self._find(Guild, _id, ignore_cache)
 
-        if not create_if_not_found:
-            return None
+    async def users_many(self, ids: Iterable[int]) -> dict[int, User | None]:
+        """user documents by id, batched with other concurrent lookups"""
+        return await self._find_many(User, self._user_batcher, ids)
+
+    async def guilds_many(self, ids: Iterable[int]) -> dict[int, Guild | None]:
+        """guild documents by id, batched with other concurrent lookups"""
+        return await self._find_many(Guild, self._guild_batcher, ids)
+
+    async def _find_view(self, document: type[Document], _id: Any, paths: tuple[str, ...], ignore_cache: bool) -> DocumentView | None:
+        if not ignore_cache and (snapshot := self.cache.get(document, _id, paths)) is not None:
+            return snapshot.load()
+
+        self.cache.begin(document, _id)
+        snapshot, completed = None, False
+
+        try:
+            snapshot = await self._inflight.run(
+                (document.Settings.name, _id, paths),
+                lambda: find_view(document, _id, paths)
+            )
+            completed = True
+        finally:
+            self.cache.end(document, _id, snapshot, paths, completed=completed)
 
-        guild = self.new.guild(_id, '', None)
-        await guild.insert()
+        return None if snapshot is None else snapshot.load()
 
-        return guild
+    async def guild_view(self, _id: int, *paths: str, ignore_cache: bool = False) -> DocumentView | None:
+        """partial guild documents, e.g. guild_view(id, 'config.auto_responses', 'config.general.timezone')"""
+        return await self._find_view(Guild, _id, paths, ignore_cache)
+
+    async def user_view(self, _id: int, *paths: str, ignore_cache: bool = False) -> DocumentView | None:
+        """partial user documents, e.g. user_view(id, 'config.tts')"""
+        return await self._find_view(User, _id, paths, ignore_cache)
 
     async def auto_response(self, _id: str, ignore_cache: bool = False) -> AutoResponse | None:
         """auto response documents"""
-        return await AutoResponse.find_one({'_id': _id}, ignore_cache=ignore_cache)
+        return await self._find(AutoResponse, _id, ignore_cache)
+
+    async def auto_responses_for_guild(
+        self,
+        guild_id: int,
+        include_global: bool = True,
+        include_custom: bool = True
+    ) -> AsyncIterator[AutoResponse]:
+        """
+        auto responses available in a guild, streamed without statistics
+
+        guild restricted auto responses are always included, global ones (no data.guild)
+        and the guild's custom ones only when requested, results must not be saved
+        """
+        query: dict[str, Any] = (
+            {'data.guild': guild_id}
+            if include_custom else
+            {'data.guild': guild_id, 'data.custom': False}
+        )
+
+        if include_global:
+            query = {'$or': [query, {'data.guild': None}]}
+
+        async for auto_response in self._stream_auto_responses(query):
+            yield auto_response
+
+    async def auto_responses(
+        self,
+        method: AutoResponseMethod | None = None,
+        type: AutoResponseType | None = None,
+        user: int | None = None
+    ) -> AsyncIterator[AutoResponse]:
+        """auto responses by method, type and/or user, streamed without statistics, results must not be saved"""
+        query: dict[str, Any] = {}
+
+        if method is not None:
+            query['method'] = method.value
+
+        if type is not None:
+            query['type'] = type.value
+
+        if user is not None:
+            query['data.user'] = user
+
+        async for auto_response in self._stream_auto_responses(query):
+            yield auto_response
+
+    async def _stream_auto_responses(self, query: dict) -> AsyncIterator[AutoResponse]:
+        # ? statistics change on every trigger and aren't needed for matching
+        async for raw in AutoResponse.get_motor_collection().find(query, {'statistics': 0}):
+            yield AutoResponse.model_validate(raw)
 
     async def au_mask(self, _id: PydanticObjectId, ignore_cache: bool = False) -> AutoResponseFileMask | None:
         """auto response file mask documents"""
-        return await AutoResponseFileMask.find_one({'_id': _id}, ignore_cache=ignore_cache)
+        return await self._find(AutoResponseFileMask, _id, ignore_cache)
+
+    async def au_masks_many(self, ids: Iterable[PydanticObjectId]) -> dict[PydanticObjectId, AutoResponseFileMask | None]:
+        """auto response file mask documents by id, batched with other concurrent lookups"""
+        return await self._find_many(AutoResponseFileMask, self._au_mask_batcher, ids)
 
     async def modmail(self, _id: str, ignore_cache: bool = False) -> ModMail | None:
         """modmail documents"""
-        return await ModMail.find_one({'_id': _id}, ignore_cache=ignore_cache)
+        return await self._find(ModMail, _id, ignore_cache)
 
     async def qotd_metric(self, _id: int | str, ignore_cache: bool = False) -> QOTDResponseMetric:
         """qotd metric documents"""
-        metric = await QOTDResponseMetric.find_one({'_id': _id}, ignore_cache=ignore_cache)
+        return await self._find_or_create(QOTDResponseMetric, QOTDResponseMetric(_id=_id), ignore_cache)
 
-        if metric is None:
-            metric = QOTDResponseMetric(_id=_id)
-            await metric.insert()
+    async def log(self, _id: int | str, ignore_cache: bool = False) -> Log | None:
+        """log documents, recent messages are served from memory"""
+        if not ignore_cache and (log := self.recent_messages.get(_id)) is not None:
+            return log
 
-        return metric
+        return await self._find_uncached(Log, _id, ignore_cache)
 
-    async def log(self, _id: int | str, ignore_cache: bool = False) -> Log | None:
-        """log documents"""
-        return await Log.find_one({'_id': _id}, ignore_cache=ignore_cache)
+    async def logs(
+        self,
+        guild: int,
+        since: datetime | None = None,
+        until: datetime | None = None,
+        kind: str | None = None,
+        cursor: tuple[datetime, int] | None = None,
+        limit: int = 100,
+        channel: int | None = None
+    ) -> AsyncIterator[Log]:
+        """
+        logs of a guild, newest first
+
+        pass the cursor of the last log received (Log.cursor) to get the next page,
+        pages are found through the (timestamp, _id) index instead of skipping
+        """
+        query: dict[str, Any] = {'guild': guild}
+
+        if channel is not None:
+            query['channel'] = channel
+
+        if kind is not None:
+            query['kind'] = kind
+
+        if since is not None or until is not None:
+            query['timestamp'] = {
+                **({'$gte': since} if since is not None else {}),
+                **({'$lt': until} if until is not None else {})
+            }
+
+        if cursor is not None:
+            timestamp, _id = cursor
+            query = {'$and': [query, {'$or': [
+                {'timestamp': {'$lt': timestamp}},
+                {'timestamp': timestamp, '_id': {'$lt': _id}}
+            ]}]}
+
+        async for log in Log.find(query, ignore_cache=True).sort(
+            [('timestamp', DESCENDING), ('_id', DESCENDING)]
+        ).limit(limit):
+            yield log
 
     async def tts_cache(self, _id: int, ignore_cache: bool = False) -> TTSCache | None:
         """tts cache documents"""
-        return await TTSCache.find_one({'_id': _id}, ignore_cache=ignore_cache)
+        return await self._find_uncached(TTSCache, _id, ignore_cache)
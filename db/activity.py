@@ -0,0 +1,50 @@
+from .documents import Activity, Guild
+from .counters import CounterAggregator
+from datetime import datetime
+
+
+class ActivityStore:
+    def __init__(self, counters: CounterAggregator) -> None:
+        """per-day, per-guild activity counters stored outside of guild documents"""
+        self.counters = counters
+
+    def increment(self, guild_id: int, user_id: int, day: int, amount: int = 1) -> None:
+        """count messages sent by a user on a guild day, written with the next counter flush"""
+        self.counters.increment(
+            Activity,
+            f'{guild_id}:{day}:{user_id}',
+            'messages',
+            amount,
+            on_insert={
+                'guild': guild_id,
+                'day': day,
+                'user': user_id,
+                'ts': datetime.now()
+            }
+        )
+
+    async def top_users(
+        self,
+        guild_id: int,
+        day: int,
+        timeframe: int,
+        limit: int
+    ) -> list[tuple[int, int]]:
+        """[(user_id, messages), ...] of the most active users over the last timeframe days, including day"""
+        results = await Activity.get_motor_collection().aggregate([
+            {'$match': {'guild': guild_id, 'day': {'$gt': day-timeframe, '$lte': day}}},
+            {'$group': {'_id': '$user', 'messages': {'$sum': '$messages'}}},
+            {'$sort': {'messages': -1, '_id': 1}},
+            {'$limit': limit}
+        ]).to_list(length=None)
+
+        return [(result['_id'], result['messages']) for result in results]
+
+    async def top_users_for(self, guild: Guild) -> list[tuple[int, int]]:
+        """top users using the guild's activity role timeframe and max roles"""
+        return await self.top_users(
+            guild.id,
+            guild.get_current_day(),
+            guild.config.activity_roles.timeframe,
+            guild.config.activity_roles.max_roles
+        )
@@ -0,0 +1,609 @@
+from re import Pattern, compile, error as RegexError, IGNORECASE, VERBOSE
+from typing import Awaitable, Callable, Iterable, Iterator, Sequence
+from .documents.ext.enums import AutoResponseMethod
+from asyncio import Task, sleep, get_running_loop
+from collections import OrderedDict, deque
+from .documents import AutoResponse, AutoResponseFileMask
+from bson import ObjectId
+from random import Random, random
+from time import monotonic
+
+
+MENTION_PATTERN = compile(r'<@!?(\d+)>')
+QUANTIFIER_PATTERN = compile(r'\{\d*(?:,\d*)?\}')
+# ? characters case insensitive regexes match to an ascii letter that str.lower() doesn't turn into it
+CASE_FOLDS = str.maketrans({'\u0130': 'i', '\u0131': 'i', '\u017f': 's'})
+
+
+def _class_end(pattern: str, index: int) -> int:
+    """index after the character class starting at pattern[index]"""
+    index += 1
+
+    if pattern[index:index+1] == '^':
+        index += 1
+
+    # ? a ] right after the opening bracket is part of the class
+    if pattern[index:index+1] == ']':
+        index += 1
+
+    while index < len(pattern):
+        if pattern[index] == '\\':
+            index += 2
+        elif pattern[index] == ']':
+            return index+1
+        else:
+            index += 1
+
+    return index
+
+
+def required_literal(pattern: str, flags: int = 0) -> str | None:
+    """
+    longest run of plain ascii characters every match of pattern has to contain, if one is easy to find
+
+    only looks outside of groups and treats character classes as a single unknown character,
+    gives up on top level alternation, so the result can be missing but is never wrong
+
+    search for the result in text lowered with fold_case(), case insensitive patterns also match
+    a few characters str.lower() doesn't map to ascii
+    """
+    if flags & VERBOSE:
+        return None
+
+    runs, run, depth, index = [], '', 0, 0
+
+    while index < len(pattern):
+        char = pattern[index]
+        following = pattern[index+1] if index+1 < len(pattern) else ''
+
+        if char == '\\':
+            index += 2
+
+            if depth or not following or following.isalnum() or not following.isascii():
+                runs.append(run)
+                run = ''
+                continue
+
+            char = following
+            following = pattern[index] if index < len(pattern) else ''
+        else:
+            if char == '[':
+                index = _class_end(pattern, index)
+            elif char == '{' and (quantifier := QUANTIFIER_PATTERN.match(pattern, index)):
+                index = quantifier.end()
+            else:
+                index += 1
+
+            if char == '(':
+                depth += 1
+            elif char == ')':
+                depth = max(depth-1, 0)
+            elif char == '|' and not depth:
+                return None
+
+            if depth or not (char.isascii() and char.isalnum() or char == ' '):
+                runs.append(run)
+                run = ''
+                continue
+
+        if following and following in '?*{':
+            runs.append(run)
+            run = ''
+        elif following == '+':
+            runs.append(run+char)
+            run = ''
+        else:
+            run += char
+
+    runs.append(run)
+    return max(runs, key=len) or None
+
+
+def fold_case(content: str) -> str:
+    """content lowered for finding required literals"""
+    if content.isascii():
+        return content.lower()
+
+    return content.translate(CASE_FOLDS).lower()
+
+
+class AhoCorasick:
+    def __init__(self, words: Iterable[str]) -> None:
+        """automaton finding every occurrence of every word in one pass over the text"""
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[tuple[str, ...]] = [()]
+
+        for word in set(words):
+            if word:
+                self._add(word)
+
+        self._link()
+
+    def _add(self, word: str) -> None:
+        node = 0
+
+        for char in word:
+            if (child := self._goto[node].get(char)) is None:
+                child = len(self._goto)
+                self._goto[node][char] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+
+            node = child
+
+        self._output[node] += (word,)
+
+    def _link(self) -> None:
+        queue = deque(self._goto[0].values())
+
+        while queue:
+            node = queue.popleft()
+
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+
+                self._fail[child] = self._goto[fail].get(char, 0)
+                # ? outputs of the fallback node end here too, merge them so find doesn't walk fail links
+                self._output[child] += self._output[self._fail[child]]
+
+    def find(self, text: str) -> Iterator[tuple[int, str]]:
+        """yields (start, word) for every occurrence, overlapping ones included"""
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+
+        for index, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+
+            node = goto[node].get(char, 0)
+
+            for word in output[node]:
+                yield index-len(word)+1, word
+
+
+class AutoResponseMatcher:
+    def __init__(self, auto_responses: Iterable[AutoResponse]) -> None:
+        """
+        every auto response of a guild compiled for matching a message in one pass
+
+        exact         the whole message is the trigger
+        contains      the trigger appears surrounded by whitespace or the ends of the message
+        regex         the trigger is searched for as a raw regex
+        mention       the message mentions the user id in the trigger
+
+        with data.regex exact and contains triggers are regexes with the same delimitation,
+        triggers are case insensitive unless data.case_sensitive is set
+
+        regexes are only run when the literal they require is in the message,
+        those literals are found with the same single pass automaton as contains triggers
+        """
+        self.auto_responses: dict[str, AutoResponse] = {}
+        self._exact: dict[str, set[str]] = {}
+        self._exact_lower: dict[str, set[str]] = {}
+        self._contains: dict[str, set[str]] = {}
+        self._contains_lower: dict[str, set[str]] = {}
+        self._mentions: dict[str, set[str]] = {}
+        self._patterns: dict[str, Pattern] = {}
+        self._literals: dict[str, set[str]] = {}
+        self._unfiltered: set[str] = set()
+        # ? where each id is indexed, so it can be removed without a rebuild
+        self._slots: dict[str, tuple[dict[str, set[str]], str]] = {}
+        self._stale = True
+
+        for auto_response in auto_responses:
+            self._add(auto_response)
+
+    def patch(self, auto_responses: Iterable[AutoResponse] = (), deleted: Iterable[str] = ()) -> None:
+        """
+        add or replace auto_responses and remove deleted ids
+
+        only the changed triggers are compiled, automatons are rebuilt on the next match
+        """
+        for _id in deleted:
+            self._remove(_id)
+
+        for auto_response in auto_responses:
+            self._remove(auto_response.id)
+            self._add(auto_response)
+
+    def _add(self, au: AutoResponse) -> None:
+        if au.method == AutoResponseMethod.disabled:
+            return
+
+        self.auto_responses[au.id] = au
+        case_sensitive = au.data.case_sensitive
+        source = None
+
+        match au.method:
+            case AutoResponseMethod.exact if not au.data.regex:
+                slot = (self._exact, au.trigger) if case_sensitive else (self._exact_lower, au.trigger.lower())
+            case AutoResponseMethod.contains if not au.data.regex:
+                slot = (self._contains, au.trigger) if case_sensitive else (self._contains_lower, au.trigger.lower())
+                self._stale = True
+            case AutoResponseMethod.mention:
+                slot = (self._mentions, au.trigger)
+            case AutoResponseMethod.exact:
+                source = rf'\A(?:{au.trigger})\Z'
+            case AutoResponseMethod.contains:
+                source = rf'(?<!\S)(?:{au.trigger})(?!\S)'
+            case _:
+                source = au.trigger
+
+        if source is not None:
+            try:
+                self._patterns[au.id] = compile(source, 0 if case_sensitive else IGNORECASE)
+            except RegexError:
+                return  # ? invalid triggers never match
+
+            if not (literal := required_literal(au.trigger, self._patterns[au.id].flags)):
+                self._unfiltered.add(au.id)
+                return
+
+            slot = (self._literals, literal.lower())
+            self._stale = True
+
+        index, key = self._slots[au.id] = slot
+        index.setdefault(key, set()).add(au.id)
+
+    def _remove(self, _id: str) -> None:
+        if self.auto_responses.pop(_id, None) is None:
+            return
+
+        self._patterns.pop(_id, None)
+        self._unfiltered.discard(_id)
+
+        if (slot := self._slots.pop(_id, None)) is None:
+            return
+
+        index, key = slot
+        index[key].discard(_id)
+
+        if not index[key]:
+            del index[key]
+
+        if index is self._contains or index is self._contains_lower or index is self._literals:
+            self._stale = True
+
+    def _build_automatons(self) -> None:
+        self._automaton = AhoCorasick(self._contains)
+        self._automaton_lower = AhoCorasick(self._contains_lower)
+        self._literal_automaton = AhoCorasick(self._literals)
+        self._stale = False
+
+    @staticmethod
+    def _delimited(text: str, start: int, end: int) -> bool:
+        return (
+            (start == 0 or text[start-1].isspace()) and
+            (end == len(text) or text[end].isspace())
+        )
+
+    def match(self, content: str) -> set[str]:
+        """ids of every auto response triggered by content"""
+        matches: set[str] = set()
+        lowered = content.lower()
+
+        if self._stale:
+            self._build_automatons()
+
+        matches.update(self._exact.get(content, ()))
+        matches.update(self._exact_lower.get(lowered, ()))
+
+        for automaton, text, words in (
+            (self._automaton, content, self._contains),
+            (self._automaton_lower, lowered, self._contains_lower)
+        ):
+            if not words:
+                continue
+
+            for start, word in automaton.find(text):
+                if self._delimited(text, start, start+len(word)):
+                    matches.update(words[word])
+
+        if self._mentions:
+            for user_id in MENTION_PATTERN.findall(content):
+                matches.update(self._mentions.get(user_id, ()))
+
+        # ? only patterns whose required literal is in the message can match
+        candidates = self._unfiltered.copy()
+
+        if self._literals:
+            for _, literal in self._literal_automaton.find(lowered if content.isascii() else fold_case(content)):
+                candidates.update(self._literals[literal])
+
+        matches.update(
+            _id
+            for _id in candidates
+            if self._patterns[_id].search(content)
+        )
+
+        return matches
+
+
+class AutoResponseMatchers:
+    def __init__(self) -> None:
+        """compiled matchers by guild id, rebuilt after invalidate()"""
+        self._matchers: dict[int, AutoResponseMatcher] = {}
+        self._effective: dict[int, Callable[[AutoResponse], AutoResponse | None]] = {}
+
+    def get(
+        self,
+        guild_id: int,
+        auto_responses: Callable[[], Iterable[AutoResponse]],
+        effective: Callable[[AutoResponse], AutoResponse | None] | None = None
+    ) -> AutoResponseMatcher:
+        """
+        the guild's matcher, auto_responses is only called to get the guild's effective set when compiling
+
+        effective returns the guild's version of a changed auto response (e.g. with its overrides applied),
+        or None if it's not part of the guild's set, matchers compiled without it are rebuilt after every
+        change instead of patched
+
+        both are only used until the matcher is invalidated, invalidate the guild when its config changes
+        """
+        if (matcher := self._matchers.get(guild_id)) is None:
+            matcher = self._matchers[guild_id] = AutoResponseMatcher(auto_responses())
+
+            if effective is not None:
+                self._effective[guild_id] = effective
+
+        return matcher
+
+    def patch(self, auto_responses: Iterable[AutoResponse] = (), deleted: Iterable[str] = ()) -> None:
+        """patch every compiled matcher with its guild's effective version of auto_responses"""
+        auto_responses, deleted = list(auto_responses), list(deleted)
+
+        if not auto_responses and not deleted:
+            return
+
+        for guild_id in list(self._matchers):
+            if (effective := self._effective.get(guild_id)) is None:
+                self.invalidate(guild_id)
+                continue
+
+            upserts, removed = [], deleted.copy()
+
+            for auto_response in auto_responses:
+                if (guild_auto_response := effective(auto_response)) is None:
+                    removed.append(auto_response.id)
+                else:
+                    upserts.append(guild_auto_response)
+
+            self._matchers[guild_id].patch(upserts, removed)
+
+    def invalidate(self, guild_id: int | None = None) -> None:
+        """drop one guild's matcher, or every matcher if guild_id is None"""
+        if guild_id is None:
+            self._matchers.clear()
+            self._effective.clear()
+            return
+
+        self._matchers.pop(guild_id, None)
+        self._effective.pop(guild_id, None)
+
+
+class AutoResponseReloader:
+    def __init__(
+        self,
+        matchers: AutoResponseMatchers,
+        fetch: Callable[[list[str]], Awaitable[list[AutoResponse]]],
+        delay: float = 1.0
+    ) -> None:
+        """
+        applies auto response reloads to matchers incrementally
+
+        reloads requested within delay seconds of each other are merged into one,
+        a reload without any ids drops every matcher instead
+
+        on_reload callbacks are awaited after every reload with the changed ids, or None after a full reload,
+        failed reloads are retried after delay seconds and last_error is the latest error
+        """
+        self.matchers = matchers
+        self.fetch = fetch
+        self.delay = delay
+        self.last_error: Exception | None = None
+        self.on_reload: list[Callable[[set[str] | None], Awaitable[None]]] = []
+        self._full = False
+        self._upserts: set[str] = set()
+        self._deleted: set[str] = set()
+        self._last_request = 0.0
+        self._task: Task | None = None
+
+    def request(
+        self,
+        added: Iterable[str] = (),
+        changed: Iterable[str] = (),
+        deleted: Iterable[str] = ()
+    ) -> None:
+        """queue a reload, e.g. request(**RequestReloadAU.data.model_dump())"""
+        upserts, deleted = {*added, *changed}, set(deleted)
+
+        if not upserts and not deleted:
+            self._full = True
+
+        self._upserts = (self._upserts-deleted) | upserts
+        self._deleted = (self._deleted-upserts) | deleted
+        self._last_request = monotonic()
+
+        if self._task is None:
+            self._task = get_running_loop().create_task(self._run())
+
+    def close(self) -> None:
+        """cancel a pending reload"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            while (remaining := self._last_request+self.delay-monotonic()) > 0:
+                await sleep(remaining)
+
+            try:
+                await self.apply()
+            except Exception as e:
+                # ? ids of a failed fetch were requested again, retried after another delay
+                self.last_error = e
+                self._last_request = monotonic()
+
+            # ? requested while applying, or requested again after a failure
+            if not (self._full or self._upserts or self._deleted):
+                break
+
+        self._task = None
+
+    async def apply(self) -> None:
+        """apply everything requested so far without waiting for the delay, ids of a failed fetch are requested again"""
+        full, upserts, deleted = self._full, self._upserts, self._deleted
+        self._full, self._upserts, self._deleted = False, set(), set()
+
+        if full:
+            self.matchers.invalidate()
+            changed = None
+        else:
+            try:
+                auto_responses = await self.fetch(list(upserts)) if upserts else []
+            except BaseException:
+                # ? requests made during the fetch are newer and win
+                self._upserts, self._deleted = (
+                    self._upserts | (upserts-self._deleted),
+                    self._deleted | (deleted-self._upserts)
+                )
+                raise
+
+            # ? ids that no longer exist were deleted after the request was sent
+            deleted |= upserts-{au.id for au in auto_responses}
+            self.matchers.patch(auto_responses, deleted)
+            changed = upserts | deleted
+
+        for callback in self.on_reload:
+            await callback(changed)
+
+
+class AliasTable:
+    def __init__(self, weights: Sequence[float]) -> None:
+        """draws index i with probability weights[i]/sum(weights) in constant time (vose's alias method)"""
+        total = sum(weights)
+
+        if not weights or total <= 0:
+            raise ValueError('at least one weight must be positive')
+
+        size = len(weights)
+        scaled = [weight*size/total for weight in weights]
+        self._probability = [1.0]*size
+        self._alias = list(range(size))
+        small = [i for i, weight in enumerate(scaled) if weight < 1.0]
+        large = [i for i, weight in enumerate(scaled) if weight >= 1.0]
+
+        while small and large:
+            less, more = small.pop(), large.pop()
+            self._probability[less] = scaled[less]
+            self._alias[less] = more
+            scaled[more] += scaled[less]-1.0
+            (small if scaled[more] < 1.0 else large).append(more)
+
+        # ? leftovers are 1.0 up to float error
+
+    def draw(self, rng: Random | None = None) -> int:
+        roll = (rng.random if rng is not None else random)()*len(self._probability)
+        index = int(roll)
+        return index if roll-index < self._probability[index] else self._alias[index]
+
+
+class AutoResponseSelector:
+    def __init__(self, max_tables: int = 1024) -> None:
+        """
+        picks one of several triggered auto responses
+
+        the old behavior picked by data.weight, rolled data.chance and rerolled on failure,
+        which selects each auto response with probability proportional to weight*chance,
+        that distribution is drawn directly from an alias table cached per candidate set
+        """
+        self.max_tables = max_tables
+        self._tables: OrderedDict[frozenset[tuple[str, float]], tuple[tuple[str, ...], AliasTable | None]] = OrderedDict()
+
+    def select(self, auto_responses: Iterable[AutoResponse], rng: Random | None = None) -> AutoResponse | None:
+        """one of auto_responses, None if none of them can trigger"""
+        candidates: dict[str, AutoResponse] = {}
+        weights: dict[str, float] = {}
+
+        # ? one pass, attribute reads on lazily parsed documents are slow
+        for au in auto_responses:
+            _id, data = au.id, au.data
+            candidates[_id] = au
+            weights[_id] = max(data.weight, 0)*data.chance
+
+        if not candidates:
+            return None
+
+        # ? keyed by the values themselves, guild overrides can change them without changing the id
+        key = frozenset(weights.items())
+
+        if (entry := self._tables.get(key)) is None:
+            ids = tuple(weights)
+            entry = self._tables[key] = (ids, AliasTable([weights[_id] for _id in ids]) if any(weights.values()) else None)
+
+            while len(self._tables) > self.max_tables:
+                self._tables.popitem(last=False)
+        else:
+            self._tables.move_to_end(key)
+
+        ids, table = entry
+
+        if table is None:
+            return None
+
+        return candidates[ids[table.draw(rng)]]
+
+
+class AutoResponseMasks:
+    def __init__(self) -> None:
+        """file mask id to auto response id, kept in memory so resolving a mask is a dict lookup"""
+        self.masks: dict[ObjectId, str] = {}
+
+    def get(self, mask_id: ObjectId) -> str | None:
+        return self.masks.get(mask_id)
+
+    async def load(self) -> None:
+        """(re)load every mask"""
+        masks = {}
+
+        async for raw in AutoResponseFileMask.get_motor_collection().find({}, {'au': 1}):
+            masks[raw['_id']] = raw['au']
+
+        self.masks = masks
+
+    async def reload(self, au_ids: set[str] | None) -> None:
+        """reload the masks of au_ids, or every mask if au_ids is None, fits AutoResponseReloader.on_reload"""
+        if au_ids is None:
+            await self.load()
+            return
+
+        masks = {
+            raw['_id']: raw['au']
+            async for raw in AutoResponseFileMask.get_motor_collection().find(
+                {'au': {'$in': list(au_ids)}}, {'au': 1})
+        }
+
+        for mask_id, au in list(self.masks.items()):
+            if au in au_ids and mask_id not in masks:
+                del self.masks[mask_id]
+
+        self.masks.update(masks)
+
+    def handle(self, change: dict) -> None:
+        """apply an au_mask change stream event"""
+        mask_id = change['documentKey']['_id']
+
+        match change['operationType']:
+            case 'delete':
+                self.masks.pop(mask_id, None)
+            case 'insert' | 'replace':
+                self.masks[mask_id] = change['fullDocument']['au']
+            case 'update' if 'au' in change['updateDescription']['updatedFields']:
+                self.masks[mask_id] = change['updateDescription']['updatedFields']['au']
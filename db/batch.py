@@ -0,0 +1,114 @@
+from asyncio import Future, Task, TimerHandle, ensure_future, get_running_loop, shield
+from typing import Any, Awaitable, Callable, Iterable, TypeVar
+from .cache import DocumentSnapshot
+from beanie import Document
+
+
+T = TypeVar('T')
+D = TypeVar('D', bound=Document)
+
+
+class InFlight:
+    def __init__(self) -> None:
+        """shares one pending lookup between identical concurrent requests"""
+        self._pending: dict[tuple[str, Any], Future] = {}
+
+    def get(self, key: tuple[str, Any]) -> Future | None:
+        return self._pending.get(key)
+
+    def put(self, key: tuple[str, Any], future: Future) -> None:
+        self._pending[key] = future
+        future.add_done_callback(lambda _: self._discard(key, future))
+
+    def _discard(self, key: tuple[str, Any], future: Future) -> None:
+        if self._pending.get(key) is future:
+            del self._pending[key]
+
+    async def run(self, key: tuple[str, Any], factory: Callable[[], Awaitable[T]]) -> T:
+        """await factory(), or the already pending call for the same key"""
+        if (future := self.get(key)) is None:
+            future = ensure_future(factory())
+            self.put(key, future)
+
+        # ? shielded so one cancelled caller doesn't cancel the lookup for everyone else
+        return await shield(future)
+
+
+class DocumentBatcher:
+    def __init__(
+        self,
+        document: type[D],
+        inflight: InFlight,
+        window: float = 0.002,
+        max_batch: int = 256
+    ) -> None:
+        """collects lookups by id over a short window and sends them as one $in query"""
+        self.document = document
+        self.inflight = inflight
+        self.window = window
+        self.max_batch = max_batch
+        self._name = document.Settings.name
+        self._queued: dict[Any, Future] = {}
+        self._timer: TimerHandle | None = None
+        self._tasks: set[Task] = set()
+
+    async def get(self, _id: Any) -> DocumentSnapshot[D] | None:
+        return (await self.get_many([_id]))[_id]
+
+    async def get_many(self, ids: Iterable[Any]) -> dict[Any, DocumentSnapshot[D] | None]:
+        """snapshots of documents by id, None for ids that don't exist"""
+        futures: dict[Any, Future] = {}
+
+        for _id in dict.fromkeys(ids):
+            key = (self._name, _id)
+
+            if (future := self.inflight.get(key)) is None:
+                future = get_running_loop().create_future()
+                self.inflight.put(key, future)
+                self._queue(_id, future)
+
+            futures[_id] = future
+
+        return {_id: await shield(future) for _id, future in futures.items()}
+
+    def _queue(self, _id: Any, future: Future) -> None:
+        self._queued[_id] = future
+
+        if len(self._queued) >= self.max_batch:
+            self._flush_now()
+            return
+
+        if self._timer is None:
+            self._timer = get_running_loop().call_later(
+                self.window, self._flush_now)
+
+    def _flush_now(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        queued, self._queued = self._queued, {}
+
+        if not queued:
+            return
+
+        task = get_running_loop().create_task(self._flush(queued))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush(self, queued: dict[Any, Future]) -> None:
+        try:
+            found = {
+                raw['_id']: DocumentSnapshot(self.document, raw)
+                async for raw in self.document.get_motor_collection().find(
+                    {'_id': {'$in': list(queued)}})
+            }
+        except Exception as e:
+            for future in queued.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        for _id, future in queued.items():
+            if not future.done():
+                future.set_result(found.get(_id))
@@ -0,0 +1,367 @@
+from asyncio import CancelledError, Task, sleep, get_running_loop
+from typing import Any, AsyncContextManager, AsyncIterator, Awaitable, Callable, Generic, TypeVar
+from .documents.ext.revision import next_revision
+from beanie.odm.utils.parsing import parse_obj
+from collections import Counter, OrderedDict
+from hashlib import blake2b
+from beanie import Document
+from bson import BSON
+from math import ceil, log
+from time import monotonic
+
+
+CHANGE_OPERATIONS = ['insert', 'update', 'replace', 'delete']
+D = TypeVar('D', bound=Document)
+
+
+class DocumentSnapshot(Generic[D]):
+    __slots__ = ('document', 'nbytes', 'revision', '_data')
+
+    def __init__(self, document: type[D], raw: dict) -> None:
+        """
+        a raw document as returned by the database, kept encoded
+
+        every load() parses a new instance, so callers sharing a snapshot never share a mutable document
+        """
+        self.document = document
+        self._data = BSON.encode(raw)
+        self.nbytes = len(self._data)
+        self.revision = next_revision()
+
+    def load(self) -> D:
+        doc = parse_obj(self.document, self._data.decode())
+
+        # ? instances of one snapshot hold the same data, so compiled caches keyed by revision keep hitting
+        if '_revision' in doc.__pydantic_private__:
+            doc.__pydantic_private__['_revision'] = self.revision
+
+        return doc
+
+
+class NegativeCache:
+    def __init__(self, max_entries: int = 100_000, default_ttl: float = 5.0) -> None:
+        """remembers ids that were not found, for ttls[collection] seconds"""
+        self.max_entries = max_entries
+        self.default_ttl = default_ttl
+        self.ttls: dict[str, float] = {}
+        self.hits = 0
+        self._entries: OrderedDict[tuple[str, Any], float] = OrderedDict()
+
+    def __contains__(self, key: tuple[str, Any]) -> bool:
+        if (expires := self._entries.get(key)) is None:
+            return False
+
+        if monotonic() > expires:
+            del self._entries[key]
+            return False
+
+        self.hits += 1
+        return True
+
+    def add(self, key: tuple[str, Any]) -> None:
+        self._entries.pop(key, None)
+        self._entries[key] = monotonic()+self.ttls.get(key[0], self.default_ttl)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def discard(self, key: tuple[str, Any]) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float = 0.01) -> None:
+        """probabilistic set, no false negatives and roughly error_rate false positives at capacity"""
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.size = max(ceil(-capacity*log(error_rate)/(log(2)**2)), 8)
+        self.hash_count = max(round(self.size/capacity*log(2)), 1)
+        self.ready = False
+        self._bits = bytearray(ceil(self.size/8))
+
+    def _positions(self, value: Any) -> list[int]:
+        digest = blake2b(repr(value).encode(), digest_size=16).digest()
+        a, b = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(a+i*b) % self.size for i in range(self.hash_count)]
+
+    def add(self, value: Any) -> None:
+        for position in self._positions(value):
+            self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, value: Any) -> bool:
+        return all(
+            self._bits[position >> 3] & (1 << (position & 7))
+            for position in self._positions(value)
+        )
+
+
+class DocumentCache:
+    def __init__(self, ttl: float = 3600.0, max_bytes: int = 256*1024*1024) -> None:
+        """
+        document cache invalidated by a change stream
+
+        while the stream is connected entries are kept for ttl seconds,
+        otherwise the document's own cache_expiration_time is used
+
+        entries from all collections share one least recently used budget of max_bytes,
+        sizes are estimated from the serialized document
+
+        variants (e.g. projected views) are cached next to the full document and invalidated with it
+
+        full documents are cached as DocumentSnapshots, callers load their own instance from them
+        """
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.connected = False
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+        self._entries: OrderedDict[tuple[str, Any, Any], tuple[Any, float, int]] = OrderedDict()
+        self._variants: dict[tuple[str, Any], set[Any]] = {}
+        self._fetching: Counter[tuple[str, Any]] = Counter()
+        self._stale: set[tuple[str, Any]] = set()
+        self.negative = NegativeCache()
+        self.filters: dict[str, BloomFilter] = {}
+
+    @staticmethod
+    def _key(document: type[Document], _id: Any) -> tuple[str, Any]:
+        return (document.Settings.name, _id)
+
+    @staticmethod
+    def _size(value: Any) -> int:
+        if (size := getattr(value, 'nbytes', None)) is not None:
+            return size
+
+        return len(value.model_dump_json())
+
+    def _expiry(self, document: type[Document]) -> float:
+        if self.connected:
+            return self.ttl
+
+        return document.Settings.cache_expiration_time.total_seconds()
+
+    def get(self, document: type[Document], _id: Any, variant: Any = None) -> Any | None:
+        key = (*self._key(document, _id), variant)
+
+        if (entry := self._entries.get(key)) is None:
+            self.misses += 1
+            return None
+
+        value, cached_at, _ = entry
+
+        if monotonic()-cached_at > self._expiry(document):
+            self._remove(key)
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def _store(self, key: tuple[str, Any, Any], value: Any) -> None:
+        self._remove(key)
+        size = self._size(value)
+        self._entries[key] = (value, monotonic(), size)
+        self._variants.setdefault(key[:2], set()).add(key[2])
+        self.bytes += size
+
+        while self.bytes > self.max_bytes and self._entries:
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key: tuple[str, Any, Any]) -> None:
+        if (entry := self._entries.pop(key, None)) is None:
+            return
+
+        self.bytes -= entry[2]
+        variants = self._variants[key[:2]]
+        variants.discard(key[2])
+
+        if not variants:
+            del self._variants[key[:2]]
+
+    def begin(self, document: type[Document], _id: Any) -> None:
+        """mark a fetch as started, invalidations before end() will stop the result from being cached"""
+        self._fetching[self._key(document, _id)] += 1
+
+    def end(
+        self,
+        document: type[Document],
+        _id: Any,
+        value: Any | None,
+        variant: Any = None,
+        store: bool = True,
+        completed: bool = True
+    ) -> None:
+        """
+        finish a fetch, a completed full document fetch that found nothing is remembered as missing
+
+        fetches that raised or were cancelled pass completed=False, their None means nothing
+        """
+        key = self._key(document, _id)
+        self._fetching[key] -= 1
+
+        if key not in self._stale and completed:
+            if value is None and variant is None:
+                self.negative.add(key)
+            elif value is not None and store:
+                self._store((*key, variant), value)
+
+        if self._fetching[key] <= 0:
+            del self._fetching[key]
+            self._stale.discard(key)
+
+    def set(self, document: type[Document], _id: Any, value: Any, variant: Any = None) -> None:
+        self._store((*self._key(document, _id), variant), value)
+
+    def is_missing(self, document: type[Document], _id: Any) -> bool:
+        """whether a document is known not to exist, without asking the database"""
+        key = self._key(document, _id)
+
+        if key in self.negative:
+            return True
+
+        # ? filters are only complete while the change stream reports inserts from other processes
+        if (
+            self.connected and
+            (bloom := self.filters.get(key[0])) is not None and
+            bloom.ready and
+            _id not in bloom
+        ):
+            self.negative.hits += 1
+            return True
+
+        return False
+
+    def inserted(self, collection: str, _id: Any) -> None:
+        key = (collection, _id)
+        self.negative.discard(key)
+
+        if (bloom := self.filters.get(collection)) is not None:
+            bloom.add(_id)
+
+        if key in self._fetching:
+            self._stale.add(key)
+
+    def invalidate(self, collection: str, _id: Any) -> None:
+        key = (collection, _id)
+        self.negative.discard(key)
+
+        for variant in list(self._variants.get(key, ())):
+            self._remove((*key, variant))
+
+        if key in self._fetching:
+            self._stale.add(key)
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._variants.clear()
+        self.negative.clear()
+        self.bytes = 0
+        self._stale.update(self._fetching)
+
+        for bloom in self.filters.values():
+            bloom.ready = False
+
+    def hit_rate(self) -> float:
+        return self.hits/max(self.hits+self.misses, 1)
+
+
+class ChangeStreamInvalidator:
+    def __init__(
+        self,
+        cache: DocumentCache,
+        source: Callable[[], AsyncContextManager[AsyncIterator[dict]]],
+        retry_delay: float = 5.0,
+        on_connect: Callable[[], Awaitable[None]] | None = None
+    ) -> None:
+        """
+        feeds change stream events into a DocumentCache
+
+        source opens the stream, usually lambda: database.watch(pipeline),
+        anything yielding events shaped like change stream documents works as a stand-in
+
+        on_connect callbacks run in the background every time the stream (re)connects,
+        listeners[collection] are called with every change event of that collection
+        """
+        self.cache = cache
+        self.source = source
+        self.retry_delay = retry_delay
+        self.on_connect: list[Callable[[], Awaitable[None]]] = [on_connect] if on_connect is not None else []
+        self.listeners: dict[str, list[Callable[[dict], None]]] = {}
+        self._connect_tasks: set[Task] = set()
+        self._task: Task | None = None
+        self._users = 0
+
+    @staticmethod
+    def pipeline(collections: list[type[Document]], operations: list[str] = CHANGE_OPERATIONS) -> list[dict]:
+        return [{'$match': {
+            'operationType': {'$in': operations},
+            'ns.coll': {'$in': [document.Settings.name for document in collections]}
+        }}]
+
+    def start(self) -> None:
+        """start the stream, shared invalidators only run one stream for all users"""
+        self._users += 1
+
+        if self._task is None:
+            self._task = get_running_loop().create_task(self._run())
+
+    def stop(self) -> None:
+        self._users = max(self._users-1, 0)
+
+        if self._users or self._task is None:
+            return
+
+        self._task.cancel()
+        self._task = None
+        self.cache.connected = False
+
+    def listen(self, collection: str, listener: Callable[[dict], None]) -> None:
+        self.listeners.setdefault(collection, []).append(listener)
+
+    def unlisten(self, collection: str, listener: Callable[[dict], None]) -> None:
+        if listener in (listeners := self.listeners.get(collection, [])):
+            listeners.remove(listener)
+
+    def handle(self, change: dict) -> None:
+        for listener in self.listeners.get(change['ns']['coll'], ()):
+            listener(change)
+
+        if change['operationType'] == 'insert':
+            self.cache.inserted(
+                change['ns']['coll'],
+                change['documentKey']['_id']
+            )
+            return
+
+        self.cache.invalidate(
+            change['ns']['coll'],
+            change['documentKey']['_id']
+        )
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                async with self.source() as stream:
+                    # ? events may have been missed while disconnected
+                    self.cache.clear()
+                    self.cache.connected = True
+
+                    for callback in self.on_connect:
+                        task = get_running_loop().create_task(callback())
+                        self._connect_tasks.add(task)
+                        task.add_done_callback(self._connect_tasks.discard)
+
+                    async for change in stream:
+                        self.handle(change)
+            except CancelledError:
+                raise
+            except Exception:
+                pass
+            finally:
+                self.cache.connected = False
+
+            await sleep(self.retry_delay)
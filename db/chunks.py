@@ -0,0 +1,88 @@
+from motor.motor_asyncio import AsyncIOMotorDatabase, AsyncIOMotorGridFSBucket
+from typing import AsyncIterable, AsyncIterator, Callable
+from gridfs.errors import NoFile
+from datetime import datetime
+
+
+class ChunkedStore:
+    def __init__(
+        self,
+        database: Callable[[], AsyncIOMotorDatabase],
+        bucket_name: str,
+        chunk_size: int = 255*1024
+    ) -> None:
+        """
+        binary payloads split into gridfs chunks, keyed by filename
+
+        database is called on first use, so the store can be created before beanie is initialized
+        """
+        self.database = database
+        self.bucket_name = bucket_name
+        self.chunk_size = chunk_size
+        self._bucket: AsyncIOMotorGridFSBucket | None = None
+
+    @property
+    def bucket(self) -> AsyncIOMotorGridFSBucket:
+        if self._bucket is None:
+            self._bucket = AsyncIOMotorGridFSBucket(
+                self.database(),
+                bucket_name=self.bucket_name,
+                chunk_size_bytes=self.chunk_size
+            )
+
+        return self._bucket
+
+    async def put(self, key: str, data: bytes | AsyncIterable[bytes]) -> int:
+        """store data, or write chunks as they're produced, returns total length"""
+        await self.delete(key)
+
+        length = 0
+
+        async with self.bucket.open_upload_stream(key) as stream:
+            if isinstance(data, (bytes, bytearray, memoryview)):
+                await stream.write(data)
+                return len(data)
+
+            async for chunk in data:
+                await stream.write(chunk)
+                length += len(chunk)
+
+        return length
+
+    async def stream(self, key: str) -> AsyncIterator[bytes]:
+        """yields chunks as they arrive, nothing if the key doesn't exist"""
+        try:
+            grid_out = await self.bucket.open_download_stream_by_name(key)
+        except NoFile:
+            return
+
+        while chunk := await grid_out.readchunk():
+            yield chunk
+
+    async def read(self, key: str) -> bytes | None:
+        try:
+            grid_out = await self.bucket.open_download_stream_by_name(key)
+        except NoFile:
+            return None
+
+        return await grid_out.read()
+
+    async def delete(self, key: str) -> None:
+        async for file in self.bucket.find({'filename': key}):
+            try:
+                await self.bucket.delete(file._id)
+            except NoFile:
+                pass
+
+    async def delete_older_than(self, timestamp: datetime) -> int:
+        """delete files uploaded before timestamp, returns number deleted"""
+        deleted = 0
+
+        async for file in self.bucket.find({'uploadDate': {'$lt': timestamp}}):
+            try:
+                await self.bucket.delete(file._id)
+                deleted += 1
+            except NoFile:
+                pass
+
+        return deleted
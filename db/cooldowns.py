@@ -0,0 +1,78 @@
+from .documents.ext.enums import AUCooldownMode
+from heapq import heappop, heappush
+from time import monotonic
+
+
+class CooldownTracker:
+    def __init__(self, max_keys: int = 1_000_000) -> None:
+        """
+        auto response cooldowns by (guild, mode, scope)
+
+        expired entries are dropped from a min-heap as time passes instead of sweeping every key,
+        past max_keys the entries closest to expiring are dropped first
+        """
+        self.max_keys = max_keys
+        self._expiries: dict[tuple[int, int, int], float] = {}
+        self._heap: list[tuple[float, tuple[int, int, int]]] = []
+
+    def __len__(self) -> int:
+        return len(self._expiries)
+
+    @staticmethod
+    def _key(guild: int, mode: AUCooldownMode, scope: int | None) -> tuple[int, int, int]:
+        # ? guild cooldowns are shared by every scope in the guild
+        return (guild, mode.value, 0 if mode == AUCooldownMode.guild else scope or 0)
+
+    def _prune(self, now: float) -> None:
+        while self._heap and self._heap[0][0] <= now:
+            expiry, key = heappop(self._heap)
+
+            # ? entries replaced since they were pushed are skipped
+            if self._expiries.get(key) == expiry:
+                del self._expiries[key]
+
+    def check_and_set(
+        self,
+        guild: int,
+        mode: AUCooldownMode,
+        scope: int | None,
+        cooldown: float,
+        ignore_cooldown: bool = False
+    ) -> bool:
+        """
+        whether an auto response can trigger, starting the cooldown if it can
+
+        scope is the user or channel id for those modes, ignored for guild and none,
+        ignore_cooldown triggers without checking or starting the cooldown
+        """
+        if ignore_cooldown or mode == AUCooldownMode.none or cooldown <= 0:
+            return True
+
+        now = monotonic()
+        self._prune(now)
+        key = self._key(guild, mode, scope)
+
+        if key in self._expiries:
+            return False
+
+        while len(self._expiries) >= self.max_keys:
+            expiry, oldest = heappop(self._heap)
+
+            if self._expiries.get(oldest) == expiry:
+                del self._expiries[oldest]
+
+        expiry = now+cooldown
+        self._expiries[key] = expiry
+        heappush(self._heap, (expiry, key))
+        return True
+
+    def remaining(self, guild: int, mode: AUCooldownMode, scope: int | None) -> float:
+        """seconds until the cooldown ends, 0 if there is none"""
+        if (expiry := self._expiries.get(self._key(guild, mode, scope))) is None:
+            return 0.0
+
+        return max(expiry-monotonic(), 0.0)
+
+    def reset(self, guild: int, mode: AUCooldownMode, scope: int | None) -> None:
+        """end a cooldown early, its heap entry is skipped once it comes up"""
+        self._expiries.pop(self._key(guild, mode, scope), None)
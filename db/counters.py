@@ -0,0 +1,173 @@
+from asyncio import Task, Lock, shield, sleep, get_running_loop
+from .errors import DUPLICATE_KEY, is_transient, is_transient_write_error
+from pymongo.errors import BulkWriteError
+from collections import defaultdict
+from pymongo import UpdateOne
+from beanie import Document
+from typing import Any
+
+
+class CounterAggregator:
+    def __init__(self, max_delay: float = 10.0, max_pending: int = 5000) -> None:
+        """
+        collects counter increments in memory and writes them as bulk $inc operations
+
+        max_delay is the longest an increment can stay unflushed in seconds
+        max_pending is the number of pending documents that forces an early flush
+        dropped counts documents whose increments failed permanently, last_error is the latest write error
+
+        fields incremented here should not also be changed on a loaded document and saved,
+        a full save will overwrite increments made in the meantime
+        """
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.dropped = 0
+        self.last_error: Exception | None = None
+        self._pending = self._new_pending()
+        self._on_insert: dict[tuple[type[Document], Any], dict] = {}
+        self._pending_count = 0
+        self._lock = Lock()
+        self._task: Task | None = None
+        self._flush_task: Task | None = None
+
+    @staticmethod
+    def _new_pending() -> dict[type[Document], dict[Any, dict[str, int]]]:
+        return defaultdict(lambda: defaultdict(lambda: defaultdict(int)))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = get_running_loop().create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """stop the flush loop and write everything still pending, after a flush that's already running"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        await self.flush()
+
+    def increment(
+        self,
+        document: type[Document],
+        _id: Any,
+        path: str,
+        amount: int = 1,
+        on_insert: dict | None = None
+    ) -> None:
+        """
+        queue an increment of a dotted path, e.g. (User, 1234, 'data.statistics.command_usage')
+
+        if on_insert is given the document is upserted with on_insert as $setOnInsert
+        """
+        counters = self._pending[document][_id]
+
+        if on_insert is not None:
+            self._on_insert[(document, _id)] = on_insert
+
+        if not counters:
+            self._pending_count += 1
+
+        counters[path] += amount
+
+        if (
+            self._pending_count >= self.max_pending and
+            (self._flush_task is None or self._flush_task.done())
+        ):
+            self._flush_task = get_running_loop().create_task(self.flush())
+
+    def pending(self, document: type[Document], _id: Any, path: str) -> int:
+        """amount not yet written, for reads that need to be exact"""
+        if (counters := self._pending.get(document, {}).get(_id)) is None:
+            return 0
+
+        return counters.get(path, 0)
+
+    async def flush(self) -> None:
+        """
+        write everything pending, every collection is tried
+
+        transient failures are requeued, permanently failing increments are dropped and counted in dropped
+        """
+        async with self._lock:
+            pending, self._pending = self._pending, self._new_pending()
+            on_insert, self._on_insert = self._on_insert, {}
+            self._pending_count = 0
+
+            pending_items = list(pending.items())
+
+            for index, (document, documents) in enumerate(pending_items):
+                ids = [_id for _id, counters in documents.items() if counters]
+
+                if not ids:
+                    continue
+
+                try:
+                    await document.get_motor_collection().bulk_write([
+                        self._operation(_id, documents[_id], on_insert.get((document, _id)))
+                        for _id in ids
+                    ], ordered=False)
+                except BulkWriteError as e:
+                    # ? unordered writes apply everything but the reported operations, $inc is not idempotent
+                    # ? so only the failed ids are requeued, duplicate keys are concurrent upserts and succeed on retry
+                    self.last_error = e
+                    errors = e.details.get('writeErrors', [])
+                    retry = {
+                        ids[error['index']] for error in errors
+                        if error.get('code') == DUPLICATE_KEY or is_transient_write_error(error)
+                    }
+                    self.dropped += len(errors)-len(retry)
+                    self._requeue([(document, {_id: documents[_id] for _id in retry})], on_insert)
+                except Exception as e:
+                    self.last_error = e
+
+                    if not is_transient(e):
+                        self.dropped += len(ids)
+                        continue
+
+                    # ? if a write was applied before the connection failed it's counted twice,
+                    # ? which is preferable to losing it
+                    self._requeue([(document, documents)], on_insert)
+                except BaseException:
+                    # ? cancelled, requeue this write and everything not written yet
+                    self._requeue(pending_items[index:], on_insert)
+                    raise
+
+    @staticmethod
+    def _operation(_id: Any, counters: dict[str, int], on_insert: dict | None) -> UpdateOne:
+        if on_insert is None:
+            return UpdateOne({'_id': _id}, {'$inc': dict(counters)})
+
+        return UpdateOne(
+            {'_id': _id},
+            {'$inc': dict(counters), '$setOnInsert': on_insert},
+            upsert=True
+        )
+
+    def _requeue(
+        self,
+        pending_items: list[tuple[type[Document], dict[Any, dict[str, int]]]],
+        on_insert: dict[tuple[type[Document], Any], dict]
+    ) -> None:
+        for document, documents in pending_items:
+            for _id, counters in documents.items():
+                if (document, _id) in on_insert:
+                    self._on_insert.setdefault(
+                        (document, _id), on_insert[(document, _id)])
+
+                requeued = self._pending[document][_id]
+
+                if not requeued:
+                    self._pending_count += 1
+
+                for path, amount in counters.items():
+                    requeued[path] += amount
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await sleep(self.max_delay)
+
+            try:
+                # ? shielded so close() waits for a running flush instead of cutting it off
+                await shield(self.flush())
+            except Exception:
+                continue  # ? write errors are handled by flush, keep the loop alive whatever happens
@@ -2,6 +2,7 @@ from .au_mask import AutoResponseFileMask
 from .auto_response import AutoResponse
 from .qotd import QOTDResponseMetric
 from .tts_cache import TTSCache
+from .activity import Activity
 from .modmail import ModMail
 from .guild import Guild
 from .user import User
@@ -0,0 +1,36 @@
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from datetime import timedelta, datetime
+from beanie import Document
+from pydantic import Field
+
+
+class Activity(Document):
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, type(self)) and self.id == other.id
+
+    def __hash__(self) -> int:
+        return hash(self.id)
+
+    class Settings:
+        name = 'activity'
+        use_cache = True
+        validate_on_save = True
+        use_state_management = True
+        cache_expiration_time = timedelta(seconds=5)
+        indexes = [
+            IndexModel([('guild', ASCENDING), ('day', DESCENDING)]),
+            IndexModel(
+                [('ts', ASCENDING)],
+                expireAfterSeconds=int(timedelta(days=32).total_seconds())
+            )
+        ]
+
+    id: str = Field(description='{guild_id}:{day}:{user_id}')
+    guild: int = Field(description='guild id')
+    day: int = Field(description='guild day (see Guild.get_current_day)')
+    user: int = Field(description='user id')
+    messages: int = Field(default=0, ge=0, description='messages sent')
+    ts: datetime = Field(
+        default_factory=datetime.now,
+        description='first message of the day, used for expiry'
+    )
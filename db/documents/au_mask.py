@@ -1,5 +1,7 @@
+from beanie import Document, Insert, after_event
+from pymongo import IndexModel, ASCENDING
+from .ext.hooks import notify_insert
 from datetime import timedelta
-from beanie import Document
 from pydantic import Field
 
 
@@ -16,5 +18,10 @@ class AutoResponseFileMask(Document):
         validate_on_save = True
         use_state_management = True
         cache_expiration_time = timedelta(seconds=5)
+        indexes = [IndexModel([('au', ASCENDING)])]
+
+    @after_event(Insert)
+    def _notify_insert(self) -> None:
+        notify_insert(self.Settings.name, self.id)
 
     au: str = Field(description='auto response id')
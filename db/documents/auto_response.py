@@ -1,9 +1,27 @@
+from beanie import Document, Insert, Replace, Save, SaveChanges, Update, after_event
+from pydantic import BaseModel, Field, PrivateAttr, conlist
 from .ext.enums import AutoResponseMethod, AutoResponseType
-from pydantic import BaseModel, Field, conlist
+from typing import Any, Hashable, Mapping, Optional, Self
+from .ext.revision import next_revision, revision_of
+from pymongo import IndexModel, ASCENDING
+from .ext.hooks import notify_insert
 from ...tyrantlib import merge_dicts
-from typing import Optional, Self
+from collections import OrderedDict
 from datetime import timedelta
-from beanie import Document
+
+
+OVERRIDE_CACHE_SIZE = 4096
+_override_cache: OrderedDict[tuple, tuple[int, dict]] = OrderedDict()
+
+
+def _freeze(value: Any) -> Hashable:
+    if isinstance(value, Mapping):
+        return tuple(sorted((k, _freeze(v)) for k, v in value.items()))
+
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+
+    return value
 
 
 class AutoResponse(Document):
@@ -19,6 +37,22 @@ class AutoResponse(Document):
         validate_on_save = True
         use_state_management = True
         cache_expiration_time = timedelta(seconds=5)
+        indexes = [
+            IndexModel([('data.guild', ASCENDING), ('data.custom', ASCENDING)]),
+            IndexModel([('data.user', ASCENDING), ('data.guild', ASCENDING)]),
+            IndexModel([('method', ASCENDING), ('type', ASCENDING)]),
+            IndexModel([('type', ASCENDING), ('data.guild', ASCENDING)])
+        ]
+
+    @after_event(Insert)
+    def _notify_insert(self) -> None:
+        notify_insert(self.Settings.name, self.id)
+
+    @after_event(Replace, Save, SaveChanges, Update)
+    def _bump_revision(self) -> None:
+        self._revision = next_revision()
+
+    _revision: int = PrivateAttr(default_factory=next_revision)
 
     class AutoResponseData(BaseModel):
         class AutoResponseFollowup(BaseModel):
@@ -124,4 +158,28 @@ class AutoResponse(Document):
     )
 
     def with_overrides(self, overrides: dict) -> Self:
-        return self.model_validate(merge_dicts(self.model_dump(), overrides))
+        """
+        unsaved copy with guild overrides applied, a new instance on every call
+
+        the validated result is cached by id, revision and overrides, hits only validate the cached data
+        """
+        if not overrides:
+            return self
+
+        key = (self.id, revision_of(self), _freeze(overrides))
+
+        if (cached := _override_cache.get(key)) is not None:
+            _override_cache.move_to_end(key)
+            revision, data = cached
+            overridden = self.model_validate(data)
+            # ? copies of one entry hold the same data, like copies of one cached document
+            overridden.__pydantic_private__['_revision'] = revision
+            return overridden
+
+        overridden = self.model_validate(merge_dicts(self.model_dump(), overrides))
+        _override_cache[key] = (revision_of(overridden), overridden.model_dump())
+
+        while len(_override_cache) > OVERRIDE_CACHE_SIZE:
+            _override_cache.popitem(last=False)
+
+        return overridden
@@ -0,0 +1,15 @@
+from typing import Any, Callable
+
+
+_insert_listeners: list[Callable[[str, Any], None]] = []
+
+
+def on_insert(listener: Callable[[str, Any], None]) -> None:
+    """listener(collection, id) is called after a document is inserted from this process"""
+    if listener not in _insert_listeners:
+        _insert_listeners.append(listener)
+
+
+def notify_insert(collection: str, _id: Any) -> None:
+    for listener in _insert_listeners:
+        listener(collection, _id)
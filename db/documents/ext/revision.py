@@ -0,0 +1,15 @@
+from pydantic import BaseModel
+from itertools import count
+
+
+_revisions = count(1)
+
+
+def next_revision() -> int:
+    """process wide increasing number, documents get a new one when loaded and after every write"""
+    return next(_revisions)
+
+
+def revision_of(document: BaseModel) -> int:
+    """document._revision, read directly because private attribute lookups are slow on beanie documents"""
+    return document.__pydantic_private__['_revision']
@@ -1,9 +1,11 @@
+from beanie import Document, Insert, Replace, Save, SaveChanges, Update, after_event
+from pydantic import BaseModel, Field, PrivateAttr
 from .ext.enums import TWBFMode, AUCooldownMode
-from pydantic import BaseModel, Field
+from .ext.revision import next_revision
+from .ext.hooks import notify_insert
 from typing import Optional, Any
 from datetime import timedelta
 from datetime import datetime
-from beanie import Document
 from pytz import timezone
 
 
@@ -39,6 +41,16 @@ class Guild(Document):
         use_state_management = True
         cache_expiration_time = timedelta(seconds=1)
 
+    @after_event(Insert)
+    def _notify_insert(self) -> None:
+        notify_insert(self.Settings.name, self.id)
+
+    @after_event(Replace, Save, SaveChanges, Update)
+    def _bump_revision(self) -> None:
+        self._revision = next_revision()
+
+    _revision: int = PrivateAttr(default_factory=next_revision)
+
     class GuildConfig(BaseModel):
         class GuildConfigGeneral(BaseModel):
             hide_commands: TWBFMode = Field(
@@ -388,7 +400,7 @@ class Guild(Document):
         activity: dict[str, dict[str, int]] = Field(
             default={},
             max_length=31,
-            description='activity data for at most last 30 days\n\nformat {day:{user_id:count}}'
+            description='legacy activity data for at most last 30 days, new activity is stored in the activity collection\n\nformat {day:{user_id:count}}'
         )
         auto_responses: GuildDataAutoResponses = Field(
             default=GuildDataAutoResponses(),
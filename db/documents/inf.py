@@ -1,6 +1,9 @@
+from ..text_correction import TextCorrector
 from pydantic import BaseModel, Field
+from types import MappingProxyType
 from datetime import timedelta
 from beanie import Document
+from random import choice
 
 
 class INFBase(Document):
@@ -43,27 +46,114 @@ class INFBees(INFBase):
 
 
 class Inf:
-    @staticmethod
-    async def text_correction() -> dict[str, str]:
+    def __init__(self) -> None:
+        """inf documents kept in memory as immutable tuples, call load() once connected"""
+        self.loaded = False
+        self.text_corrections: MappingProxyType[str, str] = MappingProxyType({})
+        self.text_corrector = TextCorrector({})
+        self.excuse_intros: tuple[str, ...] = ()
+        self.excuse_scapegoats: tuple[str, ...] = ()
+        self.excuse_delays: tuple[str, ...] = ()
+        self.insult_adjectives: tuple[str, ...] = ()
+        self.insult_nouns: tuple[str, ...] = ()
+        self.eight_ball_responses: tuple[str, ...] = ()
+        self.bee_lines: tuple[str, ...] = ()
+
+    async def load(self) -> None:
+        """(re)load every inf document"""
+        documents: dict[str, INFBase] = {}
+        models = {
+            'text_correction': INFTextCorrection,
+            'excuses': INFExcuses,
+            'insults': INFInsults,
+            'eight_ball': INFEightBall,
+            'bees': INFBees
+        }
+
+        async for raw in INFExcuses.get_motor_collection().find({'_id': {'$in': list(models)}}):
+            documents[raw['_id']] = models[raw['_id']].model_validate(raw)
+
+        if (
+            (text_correction := documents.get('text_correction')) is not None and
+            text_correction.value != self.text_corrections
+        ):
+            self.text_corrections = MappingProxyType(dict(text_correction.value))
+            self.text_corrector = TextCorrector(self.text_corrections)
+
+        if (excuses := documents.get('excuses')) is not None:
+            self.excuse_intros = tuple(excuses.value.intro)
+            self.excuse_scapegoats = tuple(excuses.value.scapegoat)
+            self.excuse_delays = tuple(excuses.value.delay)
+
+        if (insults := documents.get('insults')) is not None:
+            self.insult_adjectives = tuple(insults.value.adjective)
+            self.insult_nouns = tuple(insults.value.noun)
+
+        if (eight_ball := documents.get('eight_ball')) is not None:
+            self.eight_ball_responses = tuple(eight_ball.value)
+
+        if (bees := documents.get('bees')) is not None:
+            self.bee_lines = tuple(bees.value)
+
+        self.loaded = True
+
+    async def _ensure_loaded(self) -> None:
+        if not self.loaded:
+            await self.load()
+
+    def correct_text(self, text: str) -> str:
+        """apply every text correction in one pass"""
+        return self.text_corrector.correct(text)
+
+    def random_excuse(self) -> tuple[str, str, str]:
+        """random (intro, scapegoat, delay)"""
+        return (
+            choice(self.excuse_intros),
+            choice(self.excuse_scapegoats),
+            choice(self.excuse_delays)
+        )
+
+    def random_insult(self) -> tuple[str, str]:
+        """random (adjective, noun)"""
+        return (
+            choice(self.insult_adjectives),
+            choice(self.insult_nouns)
+        )
+
+    def random_eight_ball(self) -> str:
+        return choice(self.eight_ball_responses)
+
+    def random_bee(self) -> str:
+        return choice(self.bee_lines)
+
+    async def text_correction(self) -> dict[str, str]:
         """inf text correction"""
-        return (await INFTextCorrection.find_one({'_id': 'text_correction'})).value
+        await self._ensure_loaded()
+        return dict(self.text_corrections)
 
-    @staticmethod
-    async def excuses() -> INFExcuses.INFExcuseObject:
+    async def excuses(self) -> INFExcuses.INFExcuseObject:
         """inf excuses"""
-        return (await INFExcuses.find_one({'_id': 'excuses'})).value
-
-    @staticmethod
-    async def insults() -> INFInsults.INFInsultObject:
+        await self._ensure_loaded()
+        return INFExcuses.INFExcuseObject(
+            intro=list(self.excuse_intros),
+            scapegoat=list(self.excuse_scapegoats),
+            delay=list(self.excuse_delays)
+        )
+
+    async def insults(self) -> INFInsults.INFInsultObject:
         """inf insults"""
-        return (await INFInsults.find_one({'_id': 'insults'})).value
+        await self._ensure_loaded()
+        return INFInsults.INFInsultObject(
+            adjective=list(self.insult_adjectives),
+            noun=list(self.insult_nouns)
+        )
 
-    @staticmethod
-    async def eight_ball() -> list[str]:
+    async def eight_ball(self) -> list[str]:
         """inf eight ball"""
-        return (await INFEightBall.find_one({'_id': 'eight_ball'})).value
+        await self._ensure_loaded()
+        return list(self.eight_ball_responses)
 
-    @staticmethod
-    async def bees() -> list[str]:
+    async def bees(self) -> list[str]:
         """inf bees"""
-        return (await INFBees.find_one({'_id': 'bees'})).value
+        await self._ensure_loaded()
+        return list(self.bee_lines)
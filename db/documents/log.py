@@ -1,6 +1,8 @@
-
-from datetime import timedelta
-from beanie import Document
+from pymongo import IndexModel, ASCENDING, DESCENDING
+from beanie import Document, Insert, after_event
+from datetime import timedelta, datetime
+from .ext.hooks import notify_insert
+from typing import Optional
 from pydantic import Field
 
 
@@ -17,6 +19,30 @@ class Log(Document):
         validate_on_save = True
         use_state_management = True
         cache_expiration_time = timedelta(minutes=5)
+        # ? every index ends in (timestamp, _id) to match the keyset pagination in MongoDatabase.logs
+        indexes = [
+            IndexModel([('guild', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)]),
+            IndexModel([('guild', ASCENDING), ('channel', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)]),
+            IndexModel([('guild', ASCENDING), ('kind', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)]),
+            IndexModel([('author', ASCENDING), ('timestamp', DESCENDING), ('_id', DESCENDING)])
+        ]
+
+    @after_event(Insert)
+    def _notify_insert(self) -> None:
+        notify_insert(self.Settings.name, self.id)
+
+    @property
+    def cursor(self) -> tuple[datetime, int]:
+        """position after this log, pass to MongoDatabase.logs to continue from here"""
+        return (self.timestamp, self.id)
 
     id: int = Field(description='message id')
+    guild: Optional[int] = Field(default=None, description='guild id')
+    channel: Optional[int] = Field(default=None, description='channel id')
+    author: Optional[int] = Field(default=None, description='author id')
+    kind: Optional[str] = Field(default=None, description='log kind, e.g. deleted_message')
+    timestamp: datetime = Field(
+        default_factory=datetime.now,
+        description='time of the logged event'
+    )
     data: dict = Field(default={}, description='log data')
@@ -1,6 +1,7 @@
+from beanie import Document, Insert, after_event
 from pydantic import Field, BaseModel
+from .ext.hooks import notify_insert
 from datetime import timedelta
-from beanie import Document
 from typing import Optional
 
 
@@ -12,6 +13,54 @@ class ModMail(Document):
         use_state_management = True
         cache_expiration_time = timedelta(seconds=1)
 
+    @after_event(Insert)
+    def _notify_insert(self) -> None:
+        notify_insert(self.Settings.name, self.id)
+
+    @classmethod
+    async def push_message(cls, _id: str, message: 'ModMail.ModMailMessage') -> bool:
+        """append a message without loading the thread, returns False if the modmail doesn't exist"""
+        result = await cls.get_motor_collection().update_one(
+            {'_id': _id},
+            {'$push': {'messages': message.model_dump()}}
+        )
+
+        return bool(result.matched_count)
+
+    @classmethod
+    async def message_page(
+        cls,
+        _id: str,
+        page: int = 0,
+        page_size: int = 25
+    ) -> tuple[list['ModMail.ModMailMessage'], int]:
+        """one page of messages, oldest first, and the total message count"""
+        result = await cls.get_motor_collection().aggregate([
+            {'$match': {'_id': _id}},
+            {'$project': {
+                '_id': 0,
+                'messages': {'$slice': ['$messages', page*page_size, page_size]},
+                'count': {'$size': '$messages'}
+            }}
+        ]).to_list(length=1)
+
+        if not result:
+            return [], 0
+
+        return (
+            [cls.ModMailMessage.model_validate(message) for message in result[0]['messages']],
+            result[0]['count']
+        )
+
+    @classmethod
+    async def message_count(cls, _id: str) -> int:
+        result = await cls.get_motor_collection().aggregate([
+            {'$match': {'_id': _id}},
+            {'$project': {'_id': 0, 'count': {'$size': '$messages'}}}
+        ]).to_list(length=1)
+
+        return result[0]['count'] if result else 0
+
     class ModMailMessage(BaseModel):
         author: Optional[int] = Field(
             default=None,
@@ -1,5 +1,8 @@
-from beanie import Document, BsonBinary, TimeSeriesConfig
+from beanie import Document, BsonBinary, TimeSeriesConfig, Insert, after_event
 from datetime import timedelta, datetime
+from pymongo import IndexModel, ASCENDING
+from .ext.hooks import notify_insert
+from typing import Optional
 from pydantic import Field
 
 
@@ -21,7 +24,27 @@ class TTSCache(Document):
         #     time_field='ts',
         #     expire_after_seconds=2592000 # 30 days
         # )
+        indexes = [
+            IndexModel([('ts', ASCENDING)], expireAfterSeconds=2592000),  # 30 days
+            IndexModel([('last_hit', ASCENDING)])
+        ]
+
+    @after_event(Insert)
+    def _notify_insert(self) -> None:
+        notify_insert(self.Settings.name, self.id)
 
     id: str = Field(description='TTSMessage hash')
     ts: datetime = Field(default_factory=datetime.now)
-    data: BsonBinary = Field(description='TTSMessage data')
+    last_hit: datetime = Field(
+        default_factory=datetime.now,
+        description='last time the audio was used, updated in batches'
+    )
+    data: Optional[BsonBinary] = Field(
+        default=None,
+        description='TTSMessage data, None if chunked'
+    )
+    chunked: bool = Field(
+        default=False,
+        description='data is stored in the tts_chunks gridfs bucket'
+    )
+    length: int = Field(default=0, ge=0, description='data length in bytes')
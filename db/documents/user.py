@@ -1,8 +1,9 @@
+from beanie import Document, Insert, after_event
 from pydantic import BaseModel, Field
+from .ext.hooks import notify_insert
 from typing import Optional, Any
 from .ext.enums import TTSMode
 from datetime import timedelta
-from beanie import Document
 
 
 class User(Document):
@@ -19,6 +20,10 @@ class User(Document):
         use_state_management = True
         cache_expiration_time = timedelta(seconds=1)
 
+    @after_event(Insert)
+    def _notify_insert(self) -> None:
+        notify_insert(self.Settings.name, self.id)
+
     class UserConfig(BaseModel):
         class UserConfigGeneral(BaseModel):
             no_track: bool = Field(
@@ -0,0 +1,22 @@
+from pymongo.errors import ConnectionFailure, OperationFailure, PyMongoError
+
+
+DUPLICATE_KEY = 11000
+# ? the codes pymongo retries writes on, servers stepping down, shutting down or unreachable
+TRANSIENT_CODES = frozenset({6, 7, 89, 91, 134, 189, 262, 9001, 10058, 10107, 11600, 11602, 13435, 13436})
+
+
+def is_transient(error: BaseException) -> bool:
+    """whether a failed operation is worth retrying, network errors and errors the server marks retryable"""
+    if isinstance(error, ConnectionFailure):
+        return True
+
+    if isinstance(error, PyMongoError) and error.has_error_label('RetryableWriteError'):
+        return True
+
+    return isinstance(error, OperationFailure) and error.code in TRANSIENT_CODES
+
+
+def is_transient_write_error(error: dict) -> bool:
+    """whether an entry of BulkWriteError.details['writeErrors'] is worth retrying"""
+    return error.get('code') in TRANSIENT_CODES
@@ -0,0 +1,266 @@
+from asyncio import Condition, Task, Lock, shield, sleep, get_running_loop
+from .errors import DUPLICATE_KEY, is_transient, is_transient_write_error
+from pymongo.errors import BulkWriteError
+from .documents.ext.hooks import notify_insert
+from collections import deque
+from time import perf_counter
+from .recent import RecentMessages
+from .documents import Log
+from enum import Enum
+
+
+class OverflowPolicy(Enum):
+    def __str__(self) -> str:
+        return self.name
+
+    block = 0
+    drop_newest = 1
+    drop_oldest = 2
+
+
+class LogIngestor:
+    def __init__(
+        self,
+        max_batch: int = 500,
+        max_delay: float = 1.0,
+        max_queue: int = 10_000,
+        policy: OverflowPolicy = OverflowPolicy.block,
+        recent: RecentMessages | None = None,
+        max_retries: int = 5
+    ) -> None:
+        """
+        queues Log documents and inserts them with ordered insert_many calls
+
+        a batch is written once max_batch logs are queued or max_delay seconds have passed,
+        at most max_queue logs are held in memory, past that policy decides whether
+        put() waits for a flush or a log is dropped
+
+        logs that fail to insert permanently, or transiently more than max_retries times, are dropped
+        and counted in failed, last_error is the latest write error
+
+        accepted logs are also added to recent, so they can be found before they're written
+        """
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self.max_queue = max_queue
+        self.policy = policy
+        self.recent = recent
+        self.max_retries = max_retries
+        self.inserted = 0
+        self.dropped = 0
+        self.failed = 0
+        self.last_error: Exception | None = None
+        self.flushes = 0
+        self.last_flush_latency = 0.0
+        self.total_flush_latency = 0.0
+        self._queue: deque[Log] = deque()
+        self._attempts: dict[int, int] = {}
+        self._space = Condition()
+        self._lock = Lock()
+        self._task: Task | None = None
+        self._flush_task: Task | None = None
+
+    @property
+    def depth(self) -> int:
+        return len(self._queue)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = get_running_loop().create_task(self._flush_loop())
+
+    async def close(self) -> None:
+        """stop the flush loop and write everything still queued, after a flush that's already running"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        # ? flush() takes the lock before looking at the queue, so the first call waits for a running flush,
+        # ? retries are limited, so logs that keep failing are eventually dropped and this ends
+        while True:
+            try:
+                await self.flush()
+            except Exception:
+                pass  # ? recorded in last_error
+
+            if not self._queue:
+                break
+
+    async def put(self, log: Log) -> bool:
+        """queue a log, returns False if it was dropped"""
+        if len(self._queue) >= self.max_queue:
+            match self.policy:
+                case OverflowPolicy.drop_newest:
+                    self.dropped += 1
+                    return False
+                case OverflowPolicy.drop_oldest:
+                    dropped = self._queue.popleft()
+                    self.dropped += 1
+
+                    # ? never written, so it mustn't be found in memory either
+                    if self.recent is not None:
+                        self.recent.discard(dropped.id)
+                case OverflowPolicy.block:
+                    self._schedule_flush()
+
+                    async with self._space:
+                        await self._space.wait_for(lambda: len(self._queue) < self.max_queue)
+
+        self._queue.append(log)
+
+        if self.recent is not None:
+            self.recent.add(log)
+
+        if len(self._queue) >= self.max_batch:
+            self._schedule_flush()
+
+        return True
+
+    def _schedule_flush(self) -> None:
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = get_running_loop().create_task(self.flush())
+            self._flush_task.add_done_callback(self._flush_done)
+
+    def _flush_done(self, task: Task) -> None:
+        # ? retrieved so it isn't reported as never retrieved, flush already recorded it in last_error
+        if not task.cancelled():
+            task.exception()
+
+    async def flush(self) -> None:
+        """
+        write up to max_batch queued logs
+
+        logs that fail permanently are dropped and counted in failed, transiently failing logs are requeued
+        up to max_retries times and the error is raised so callers wait before trying again
+        """
+        async with self._lock:
+            if not self._queue:
+                return
+
+            batch = [self._queue.popleft() for _ in range(min(self.max_batch, len(self._queue)))]
+            start = perf_counter()
+            written: list[Log] = []
+
+            try:
+                await Log.insert_many(batch, ordered=True)
+                written = batch
+            except BulkWriteError as e:
+                # ? ordered inserts stop at the first error, everything before it was written
+                error = e.details['writeErrors'][0]
+                index = error['index']
+                written = batch[:index]
+                # ? everything after the failed log wasn't tried
+                self._queue.extendleft(reversed(batch[index+1:]))
+
+                if error['code'] == DUPLICATE_KEY:
+                    # ? duplicate message ids were already logged, skip them
+                    self._attempts.pop(batch[index].id, None)
+                elif is_transient_write_error(error):
+                    self._retry([batch[index]], e)
+                    raise
+                else:
+                    self._fail([batch[index]], e)
+            except Exception as e:
+                if is_transient(e):
+                    self._retry(batch, e)
+                    raise
+
+                # ? the failing log is unknown, find it by writing the batch one log at a time
+                written = await self._insert_each(batch)
+            except BaseException:
+                # ? cancelled writes are requeued too, a log that was written anyway is skipped as a duplicate
+                self._queue.extendleft(reversed(batch))
+                raise
+            finally:
+                self.last_flush_latency = perf_counter()-start
+                self.total_flush_latency += self.last_flush_latency
+                self.flushes += 1
+
+                for log in written:
+                    self._attempts.pop(log.id, None)
+                    # ? insert_many doesn't fire beanie events
+                    notify_insert(Log.Settings.name, log.id)
+
+                self.inserted += len(written)
+
+                async with self._space:
+                    self._space.notify_all()
+
+    async def _insert_each(self, batch: list[Log]) -> list[Log]:
+        written = []
+
+        for index, log in enumerate(batch):
+            try:
+                await Log.insert_many([log])
+                written.append(log)
+            except BulkWriteError as e:
+                if (error := e.details['writeErrors'][0])['code'] == DUPLICATE_KEY:
+                    self._attempts.pop(log.id, None)
+                    continue
+
+                if is_transient_write_error(error):
+                    self._queue.extendleft(reversed(batch[index+1:]))
+                    self._retry([log], e)
+                    break
+
+                self._fail([log], e)
+            except Exception as e:
+                if is_transient(e):
+                    self._queue.extendleft(reversed(batch[index+1:]))
+                    self._retry([log], e)
+                    break
+
+                self._fail([log], e)
+            except BaseException:
+                self._queue.extendleft(reversed(batch[index:]))
+                raise
+
+        return written
+
+    def _retry(self, logs: list[Log], error: Exception) -> None:
+        """requeue logs that failed transiently, logs past max_retries attempts are dropped"""
+        self.last_error = error
+        retry = []
+
+        for log in logs:
+            attempts = self._attempts.get(log.id, 0)+1
+
+            if attempts > self.max_retries:
+                self._fail([log], error)
+                continue
+
+            self._attempts[log.id] = attempts
+            retry.append(log)
+
+        self._queue.extendleft(reversed(retry))
+
+    def _fail(self, logs: list[Log], error: Exception) -> None:
+        self.last_error = error
+        self.failed += len(logs)
+
+        for log in logs:
+            self._attempts.pop(log.id, None)
+
+            # ? never written, so it mustn't be found in memory either
+            if self.recent is not None:
+                self.recent.discard(log.id)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            'depth': self.depth,
+            'inserted': self.inserted,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'last_flush_latency': self.last_flush_latency,
+            'average_flush_latency': self.total_flush_latency/max(self.flushes, 1)
+        }
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await sleep(self.max_delay)
+
+            try:
+                while self._queue:
+                    # ? shielded so close() waits for a running flush instead of cutting it off
+                    await shield(self.flush())
+            except Exception:
+                continue  # ? transient errors, logs were requeued, try again next interval
@@ -0,0 +1,101 @@
+from .documents.ext.revision import revision_of
+from .documents.ext.flags import UserFlags
+from collections import OrderedDict
+from typing import Iterable
+from .documents import Guild
+
+
+class PermissionBits:
+    def __init__(self) -> None:
+        """permission names interned into bit positions, shared by every guild"""
+        self._bits: dict[str, int] = {}
+
+    def bit(self, name: str) -> int:
+        if (bit := self._bits.get(name)) is None:
+            bit = self._bits[name] = 1 << len(self._bits)
+
+        return bit
+
+    def mask(self, names: Iterable[str]) -> int:
+        mask = 0
+
+        for name in names:
+            mask |= self.bit(name)
+
+        return mask
+
+    def required(self, permission: str) -> int:
+        """bit that grants permission, 0 if no guild grants it"""
+        return self._bits.get(permission, 0)
+
+
+class GuildPermissions:
+    def __init__(self, permissions: dict[str, list[str]], bits: PermissionBits) -> None:
+        """Guild.data.permissions compiled into one mask per user or role id"""
+        self.bits = bits
+        self.everyone = bits.mask(permissions.get('@everyone', []))
+        self.masks: dict[int, int] = {
+            int(_id): bits.mask(names)
+            for _id, names in permissions.items()
+            if _id.isdigit()
+        }
+
+    def mask(self, user_id: int, role_ids: Iterable[int]) -> int:
+        masks = self.masks
+        mask = self.everyone | masks.get(user_id, 0)
+
+        for role_id in role_ids:
+            mask |= masks.get(role_id, 0)
+
+        return mask
+
+    def has(self, user_id: int, role_ids: Iterable[int], permission: str) -> bool:
+        return bool(self.mask(user_id, role_ids) & self.bits.required(permission))
+
+
+class PermissionResolver:
+    def __init__(self, max_guilds: int = 10_000) -> None:
+        """
+        permission checks against compiled guild permissions
+
+        guilds are compiled once per revision, so changes are picked up after the guild is saved or reloaded
+        """
+        self.max_guilds = max_guilds
+        self.bits = PermissionBits()
+        self._guilds: OrderedDict[int, tuple[int, GuildPermissions]] = OrderedDict()
+
+    def compiled(self, guild: Guild) -> GuildPermissions:
+        revision = revision_of(guild)
+
+        if (entry := self._guilds.get(guild.id)) is not None and entry[0] == revision:
+            self._guilds.move_to_end(guild.id)
+            return entry[1]
+
+        permissions = GuildPermissions(guild.data.permissions, self.bits)
+        self._guilds[guild.id] = (revision, permissions)
+        self._guilds.move_to_end(guild.id)
+
+        while len(self._guilds) > self.max_guilds:
+            self._guilds.popitem(last=False)
+
+        return permissions
+
+    def check(
+        self,
+        guild: Guild,
+        user_id: int,
+        role_ids: Iterable[int],
+        permission: str,
+        user_flags: int = 0,
+        dev: bool = False,
+        dev_bypass: bool = False
+    ) -> bool:
+        """
+        whether a member has permission in guild
+
+        users with UserFlags.ADMIN always pass, as do devs (e.g. bot owners) while dev_bypass is enabled
+        """
+        if user_flags & UserFlags.ADMIN or (dev and dev_bypass):
+            return True
+
+        return self.compiled(guild).has(user_id, role_ids, permission)
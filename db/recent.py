@@ -0,0 +1,70 @@
+from collections import OrderedDict
+from .documents import Log
+
+
+class RecentMessages:
+    def __init__(self, per_guild: int = 2000, max_bytes: int = 64*1024*1024) -> None:
+        """
+        ring buffer of the latest logs of every guild, indexed by message id
+
+        each guild keeps at most per_guild logs, the oldest logs of any guild are
+        dropped when all guilds together go over max_bytes
+
+        get() returns a copy, buffered logs may still be queued for insertion and must not be modified
+        """
+        self.per_guild = per_guild
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[int, tuple[Log, int]] = OrderedDict()
+        self._guilds: dict[int | None, OrderedDict[int, None]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, log: Log) -> None:
+        self.discard(log.id)
+        size = len(log.model_dump_json())
+
+        if size > self.max_bytes:
+            return
+
+        self._entries[log.id] = (log, size)
+        self.bytes += size
+        guild = self._guilds.setdefault(log.guild, OrderedDict())
+        guild[log.id] = None
+
+        if len(guild) > self.per_guild:
+            self.discard(next(iter(guild)))
+
+        while self.bytes > self.max_bytes:
+            self.discard(next(iter(self._entries)))
+
+    def get(self, _id: int) -> Log | None:
+        if (entry := self._entries.get(_id)) is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return entry[0].model_copy(deep=True)
+
+    def discard(self, _id: int) -> None:
+        if (entry := self._entries.pop(_id, None)) is None:
+            return
+
+        log, size = entry
+        self.bytes -= size
+        guild = self._guilds[log.guild]
+        del guild[_id]
+
+        if not guild:
+            del self._guilds[log.guild]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._guilds.clear()
+        self.bytes = 0
+
+    def hit_rate(self) -> float:
+        return self.hits/max(self.hits+self.misses, 1)
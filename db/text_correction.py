@@ -0,0 +1,65 @@
+from re import Match, Pattern, compile, escape, IGNORECASE
+from typing import Mapping
+
+
+def _node_pattern(node: dict) -> str:
+    terminal = '' in node
+    branches = [
+        escape(char)+_node_pattern(child)
+        for char, child in sorted(node.items())
+        if char != ''
+    ]
+
+    if not branches:
+        return ''
+
+    group = branches[0] if len(branches) == 1 else f'(?:{"|".join(branches)})'
+
+    # ? greedy optional so longer words are tried before the word ending here
+    return f'(?:{group})?' if terminal else group
+
+
+def trie_pattern(words: list[str]) -> str:
+    """single regex alternation of words, shared prefixes are only matched once"""
+    trie: dict = {}
+
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = True
+
+    return _node_pattern(trie)
+
+
+class TextCorrector:
+    def __init__(self, corrections: Mapping[str, str]) -> None:
+        """
+        applies every correction in one pass over the text
+
+        words are matched whole and case insensitively,
+        an exact case match in corrections takes priority over a lowercase one
+        """
+        self.corrections = dict(corrections)
+        self._lowered = {k.lower(): v for k, v in self.corrections.items()}
+        self._pattern: Pattern | None = None
+
+        if words := [word for word in self._lowered if word]:
+            self._pattern = compile(
+                rf'(?<!\w)(?:{trie_pattern(words)})(?!\w)',
+                IGNORECASE
+            )
+
+    def _replace(self, match: Match) -> str:
+        word = match.group()
+
+        if (correction := self.corrections.get(word)) is not None:
+            return correction
+
+        return self._lowered.get(word.lower(), word)
+
+    def correct(self, text: str) -> str:
+        if self._pattern is None:
+            return text
+
+        return self._pattern.sub(self._replace, text)
@@ -0,0 +1,408 @@
+from os import O_RDONLY, close, makedirs, open as os_open, replace, scandir, unlink, utime
+from typing import AsyncIterable, AsyncIterator, Awaitable, Callable, Optional
+from asyncio import Task, sleep, get_running_loop
+from pymongo import ASCENDING, WriteConcern
+from datetime import datetime, timedelta
+from collections import OrderedDict
+from ..tyrantlib import split_list
+from mmap import mmap, ACCESS_READ
+from .chunks import ChunkedStore
+from .documents import TTSCache
+from os.path import join, isdir
+from tempfile import mkstemp
+from hashlib import sha256
+from aiofiles import open
+
+
+class MemoryTier:
+    def __init__(self, max_bytes: int) -> None:
+        """least recently used audio kept in process, bounded by total bytes"""
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: OrderedDict[str, bytes] = OrderedDict()
+
+    def get(self, key: str) -> bytes | None:
+        if (data := self._entries.get(key)) is not None:
+            self._entries.move_to_end(key)
+
+        return data
+
+    def put(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_bytes:
+            return
+
+        self.discard(key)
+        self._entries[key] = data
+        self.bytes += len(data)
+
+        while self.bytes > self.max_bytes:
+            self.bytes -= len(self._entries.popitem(last=False)[1])
+
+    def discard(self, key: str) -> None:
+        if (data := self._entries.pop(key, None)) is not None:
+            self.bytes -= len(data)
+
+
+class DiskTier:
+    def __init__(self, path: str, max_bytes: int) -> None:
+        """
+        least recently used audio files read back through read-only memory maps
+
+        recency survives restarts through file modification times
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: OrderedDict[str, int] = OrderedDict()
+        self._writing: set[str] = set()
+
+        if not isdir(path):
+            makedirs(path)
+
+        for entry in sorted(
+            (entry for entry in scandir(path) if entry.is_file() and not entry.name.endswith('.tmp')),
+            key=lambda entry: entry.stat().st_mtime
+        ):
+            self._entries[entry.name] = entry.stat().st_size
+            self.bytes += entry.stat().st_size
+
+    @staticmethod
+    def _name(key: str) -> str:
+        return sha256(key.encode()).hexdigest()
+
+    def get(self, key: str) -> memoryview | None:
+        name = self._name(key)
+
+        if name not in self._entries:
+            return None
+
+        file_path = join(self.path, name)
+
+        if not self._entries[name]:
+            self._entries.move_to_end(name)
+            return memoryview(b'')
+
+        try:
+            fd = os_open(file_path, O_RDONLY)
+
+            try:
+                data = memoryview(mmap(fd, 0, access=ACCESS_READ))
+            finally:
+                close(fd)
+
+            utime(file_path)
+        except OSError:
+            self._forget(name)
+            return None
+
+        self._entries.move_to_end(name)
+        return data
+
+    async def put(self, key: str, data: bytes) -> None:
+        """write audio to disk, failures are ignored since the tier only holds copies"""
+        name = self._name(key)
+
+        # ? the same audio is often filled by several concurrent reads, one write is enough
+        if len(data) > self.max_bytes or name in self._writing:
+            return
+
+        self._writing.add(name)
+        tmp_path = None
+
+        try:
+            # ? unique temporary files, so a write never replaces the file with another write's partial data
+            fd, tmp_path = mkstemp(dir=self.path, prefix=f'{name}.', suffix='.tmp')
+            close(fd)
+
+            async with open(tmp_path, 'wb') as f:
+                await f.write(data)
+
+            replace(tmp_path, join(self.path, name))
+        except OSError:
+            if tmp_path is not None:
+                try:
+                    unlink(tmp_path)
+                except OSError:
+                    pass
+
+            return
+        finally:
+            self._writing.discard(name)
+
+        self._forget(name)
+        self._entries[name] = len(data)
+        self.bytes += len(data)
+
+        while self.bytes > self.max_bytes:
+            self.discard_name(next(iter(self._entries)))
+
+    def discard(self, key: str) -> None:
+        self.discard_name(self._name(key))
+
+    def discard_name(self, name: str) -> None:
+        if name not in self._entries:
+            return
+
+        self._forget(name)
+
+        try:
+            # ? open memory maps stay valid after unlinking
+            unlink(join(self.path, name))
+        except FileNotFoundError:
+            pass
+
+    def _forget(self, name: str) -> None:
+        if (size := self._entries.pop(name, None)) is not None:
+            self.bytes -= size
+
+
+class TTSAudioCache:
+    def __init__(
+        self,
+        fetch: Callable[[str], Awaitable[Optional[TTSCache]]],
+        memory_bytes: int = 64*1024*1024,
+        disk_path: str = '.tts_cache',
+        disk_bytes: int = 2*1024*1024*1024,
+        chunk_threshold: int = 1024*1024
+    ) -> None:
+        """
+        tts audio by TTSMessage hash, served from memory, then local disk, then mongo
+
+        hits are returned as memoryviews so audio can be passed on without copying,
+        audio larger than chunk_threshold is stored in chunks and can be streamed with stream()
+        """
+        self.fetch = fetch
+        self.chunk_threshold = chunk_threshold
+        self.chunks = ChunkedStore(
+            lambda: TTSCache.get_motor_collection().database,
+            'tts_chunks'
+        )
+        self.retention: TTSRetention | None = None
+        self.memory = MemoryTier(memory_bytes)
+        self.disk = DiskTier(disk_path, disk_bytes)
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.mongo_hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> memoryview | None:
+        if (document := await self._lookup(key)) is None or isinstance(document, memoryview):
+            return document
+
+        if document.chunked and (data := await self.chunks.read(key)) is None:
+            self.misses += 1
+            return None
+
+        data = data if document.chunked else document.data
+        await self._fill(key, data)
+
+        return memoryview(data)
+
+    async def stream(self, key: str) -> AsyncIterator[memoryview]:
+        """
+        yields audio as soon as it's available
+
+        local and unchunked hits are yielded whole, chunked audio is yielded chunk by chunk
+        as it arrives from mongo, then kept locally once complete
+        """
+        if (document := await self._lookup(key)) is None:
+            return
+
+        if isinstance(document, memoryview):
+            yield document
+            return
+
+        if not document.chunked:
+            await self._fill(key, document.data)
+            yield memoryview(document.data)
+            return
+
+        received = []
+
+        async for chunk in self.chunks.stream(key):
+            received.append(chunk)
+            yield memoryview(chunk)
+
+        if not received:
+            self.misses += 1
+            return
+
+        await self._fill(key, b''.join(received))
+
+    async def put(self, key: str, data: bytes) -> None:
+        """store new audio in every tier, chunked if larger than chunk_threshold"""
+        if len(data) > self.chunk_threshold:
+            await self.chunks.put(key, data)
+            await TTSCache(id=key, chunked=True, length=len(data)).insert()
+        else:
+            await TTSCache(id=key, data=data, length=len(data)).insert()
+
+        self.memory.put(key, data)
+        await self.disk.put(key, data)
+
+    async def put_stream(self, key: str, chunks: AsyncIterable[bytes]) -> None:
+        """store audio chunk by chunk while it's still being generated"""
+        length = await self.chunks.put(key, chunks)
+        await TTSCache(id=key, chunked=True, length=length).insert()
+
+    async def _lookup(self, key: str) -> memoryview | TTSCache | None:
+        """local hit as a memoryview, otherwise the mongo document without its chunks"""
+        if (data := self.memory.get(key)) is not None:
+            self.memory_hits += 1
+            self._record_hit(key)
+            return memoryview(data)
+
+        if (view := self.disk.get(key)) is not None:
+            self.disk_hits += 1
+            self._record_hit(key)
+            return view
+
+        if (document := await self.fetch(key)) is None:
+            self.misses += 1
+
+            if self.retention is not None:
+                self.retention.record_miss()
+
+        return document
+
+    async def _fill(self, key: str, data: bytes) -> None:
+        self.mongo_hits += 1
+        self._record_hit(key)
+        self.memory.put(key, data)
+        await self.disk.put(key, data)
+
+    def _record_hit(self, key: str) -> None:
+        # ? local hits still count as usage so mongo doesn't evict audio that's only served locally
+        if self.retention is not None:
+            self.retention.record_hit(key)
+
+    def discard(self, key: str) -> None:
+        """drop audio from the local tiers, e.g. after it was removed from mongo"""
+        self.memory.discard(key)
+        self.disk.discard(key)
+
+
+class TTSRetention:
+    def __init__(
+        self,
+        chunks: ChunkedStore,
+        max_bytes: int = 4*1024*1024*1024,
+        interval: float = 300.0,
+        batch_size: int = 500
+    ) -> None:
+        """
+        keeps the tts_cache collection and its chunks under max_bytes, evicting the least recently hit audio first
+
+        entries older than 30 days are removed by the ttl index on ts and their chunks by this loop,
+        hits are written to last_hit in batches with unacknowledged writes every interval seconds
+        """
+        self.chunks = chunks
+        self.max_bytes = max_bytes
+        self.interval = interval
+        self.batch_size = batch_size
+        self.hits = 0
+        self.misses = 0
+        self.bytes_reclaimed = 0
+        self.entries_evicted = 0
+        self._pending_hits: set[str] = set()
+        self._task: Task | None = None
+
+    def record_hit(self, key: str) -> None:
+        self.hits += 1
+        self._pending_hits.add(key)
+
+    def record_miss(self) -> None:
+        self.misses += 1
+
+    def hit_rate(self) -> float:
+        return self.hits/max(self.hits+self.misses, 1)
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = get_running_loop().create_task(self._run())
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        await self.flush_hits()
+
+    async def flush_hits(self) -> None:
+        pending, self._pending_hits = self._pending_hits, set()
+        # ? last_hit only orders eviction, losing an update isn't worth waiting for an ack
+        collection = TTSCache.get_motor_collection().with_options(
+            write_concern=WriteConcern(w=0))
+        now = datetime.now()
+
+        for keys in split_list(list(pending), self.batch_size):
+            await collection.update_many(
+                {'_id': {'$in': keys}},
+                {'$set': {'last_hit': now}}
+            )
+
+    async def collection_bytes(self) -> int:
+        total = 0
+        database = TTSCache.get_motor_collection().database
+
+        for name in (TTSCache.Settings.name, f'{self.chunks.bucket_name}.chunks'):
+            stats = await database[name].aggregate([
+                {'$collStats': {'storageStats': {}}}
+            ]).to_list(length=1)
+
+            total += stats[0]['storageStats']['size'] if stats else 0
+
+        return total
+
+    async def enforce_size(self) -> int:
+        """evict least recently hit entries until the collection fits, returns bytes reclaimed"""
+        excess = await self.collection_bytes()-self.max_bytes
+        reclaimed = 0
+        collection = TTSCache.get_motor_collection()
+
+        while reclaimed < excess:
+            batch = await collection.aggregate([
+                {'$sort': {'last_hit': ASCENDING}},
+                {'$limit': self.batch_size},
+                {'$project': {
+                    'chunked': 1,
+                    'size': {'$add': [
+                        {'$bsonSize': '$$ROOT'},
+                        {'$cond': ['$chunked', '$length', 0]}
+                    ]}
+                }}
+            ]).to_list(length=None)
+
+            if not batch:
+                break
+
+            await collection.delete_many({'_id': {'$in': [entry['_id'] for entry in batch]}})
+
+            for entry in batch:
+                if entry.get('chunked'):
+                    await self.chunks.delete(entry['_id'])
+
+            reclaimed += sum(entry['size'] for entry in batch)
+            self.entries_evicted += len(batch)
+
+        self.bytes_reclaimed += reclaimed
+        return reclaimed
+
+    def stats(self) -> dict[str, float]:
+        return {
+            'hit_rate': self.hit_rate(),
+            'bytes_reclaimed': self.bytes_reclaimed,
+            'entries_evicted': self.entries_evicted
+        }
+
+    async def _run(self) -> None:
+        while True:
+            await sleep(self.interval)
+
+            try:
+                await self.flush_hits()
+                # ? the ttl index only removes the documents, chunks of expired audio are left behind
+                await self.chunks.delete_older_than(datetime.now()-timedelta(days=30))
+                await self.enforce_size()
+            except Exception:
+                continue  # ? retention is best effort, try again next interval
@@ -0,0 +1,112 @@
+from typing import Annotated, Any, get_args, get_origin
+from pydantic import BaseModel, TypeAdapter
+from pydantic.fields import FieldInfo
+from functools import lru_cache
+from beanie import Document
+from bson import BSON
+
+
+class DocumentView:
+    __slots__ = ('id', 'nbytes', '_values')
+
+    def __init__(self, _id: Any, values: dict[str, Any], nbytes: int) -> None:
+        """partial document, values are validated per requested path and owned by this view"""
+        self.id = _id
+        self.nbytes = nbytes
+        self._values = values
+
+    def __getitem__(self, path: str) -> Any:
+        return self._values[path]
+
+    def __contains__(self, path: str) -> bool:
+        return path in self._values
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}(id={self.id!r}, {self._values!r})'
+
+
+class ViewSnapshot:
+    __slots__ = ('document', 'id', 'paths', 'nbytes', '_data')
+
+    def __init__(self, document: type[Document], _id: Any, paths: tuple[str, ...], raw: dict) -> None:
+        """
+        a projected raw document as returned by the database, kept encoded
+
+        every load() validates a new view, so callers sharing a snapshot never share mutable values
+        """
+        self.document = document
+        self.id = _id
+        self.paths = paths
+        self._data = BSON.encode(raw)
+        self.nbytes = len(self._data)
+
+    def load(self) -> DocumentView:
+        raw = self._data.decode()
+        values = {}
+
+        for path in self.paths:
+            adapter, field = _path_adapter(self.document, path)
+
+            try:
+                values[path] = adapter.validate_python(_walk(raw, path))
+            except KeyError:
+                # ? resolved per view, defaults are copied or built by their factory every time
+                values[path] = None if field is None else field.get_default(call_default_factory=True)
+
+        return DocumentView(self.id, values, self.nbytes)
+
+
+@lru_cache(maxsize=None)
+def _path_adapter(model: type[BaseModel], path: str) -> tuple[TypeAdapter, FieldInfo | None]:
+    """adapter and field for a dotted path, dict keys are allowed as path parts"""
+    annotation, field = model, None
+
+    for part in path.split('.'):
+        if isinstance(annotation, type) and issubclass(annotation, BaseModel):
+            if part not in annotation.model_fields:
+                raise KeyError(f'{model.__name__} has no path {path}')
+
+            field = annotation.model_fields[part]
+            annotation = field.annotation
+            continue
+
+        if get_origin(annotation) is dict:
+            annotation, field = get_args(annotation)[1], None
+            continue
+
+        raise KeyError(f'{model.__name__} has no path {path}')
+
+    if field is None:
+        return TypeAdapter(annotation), None
+
+    return TypeAdapter(Annotated[annotation, field]), field
+
+
+def _walk(raw: dict, path: str) -> Any:
+    for part in path.split('.'):
+        if not isinstance(raw, dict) or part not in raw:
+            raise KeyError(path)
+
+        raw = raw[part]
+
+    return raw
+
+
+async def find_view(document: type[Document], _id: Any, paths: tuple[str, ...]) -> ViewSnapshot | None:
+    """
+    fetch only the given dotted paths of a document, load() the snapshot to get a view
+
+    paths must not overlap (e.g. 'config' and 'config.general'), missing values use the model default
+    """
+    for path in paths:
+        _path_adapter(document, path)  # ? unknown paths raise before the query
+
+    raw = await document.get_motor_collection().find_one(
+        {'_id': _id},
+        projection={path: 1 for path in paths}
+    )
+
+    if raw is None:
+        return None
+
+    return ViewSnapshot(document, _id, paths, raw)
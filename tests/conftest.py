@@ -0,0 +1,10 @@
+from pathlib import Path
+from types import ModuleType
+import sys
+
+
+# ? the repository is the utils package of the bot, make it importable as such without installing it
+if 'utils' not in sys.modules:
+    utils = ModuleType('utils')
+    utils.__path__ = [str(Path(__file__).resolve().parents[1])]
+    sys.modules['utils'] = utils
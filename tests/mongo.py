@@ -0,0 +1,25 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from itertools import count
+import pytest
+
+
+mongomock_motor = pytest.importorskip('mongomock_motor')
+
+import utils.db as db  # noqa: E402
+
+
+_uris = count()
+
+
+@asynccontextmanager
+async def database(monkeypatch: pytest.MonkeyPatch) -> AsyncIterator[db.MongoDatabase]:
+    """a MongoDatabase on an in-memory stand-in, with its own shared cache"""
+    monkeypatch.setattr(db, 'AsyncIOMotorClient', lambda *args, **kwargs: mongomock_motor.AsyncMongoMockClient())
+    database = db.MongoDatabase(f'mongodb://test-{next(_uris)}')
+    await database.connect()
+
+    try:
+        yield database
+    finally:
+        await database.close()
@@ -0,0 +1,285 @@
+from utils.db.auto_responses import AutoResponseMatcher, AutoResponseMatchers, AutoResponseReloader, AutoResponseSelector, MENTION_PATTERN, fold_case, required_literal
+from utils.db.documents.ext.enums import AutoResponseMethod, AutoResponseType
+from re import IGNORECASE, compile, error as RegexError
+from asyncio import run, sleep
+from utils.db.documents import AutoResponse
+from random import Random
+import pytest
+
+
+def auto_response(
+    _id: str,
+    method: AutoResponseMethod,
+    trigger: str,
+    regex: bool = False,
+    case_sensitive: bool = False,
+    **data
+) -> AutoResponse:
+    # ? constructed without validation, documents can't be validated before beanie is initialized
+    return AutoResponse.model_construct(
+        id=_id,
+        method=method,
+        trigger=trigger,
+        response='',
+        type=AutoResponseType.text,
+        data=AutoResponse.AutoResponseData(regex=regex, case_sensitive=case_sensitive, **data)
+    )
+
+
+def naive_match(auto_responses: list[AutoResponse], content: str) -> set[str]:
+    """every trigger checked on its own, the way the matcher documents them"""
+    matches = set()
+
+    for au in auto_responses:
+        flags = 0 if au.data.case_sensitive else IGNORECASE
+        trigger = au.trigger if au.data.case_sensitive else au.trigger.lower()
+        text = content if au.data.case_sensitive else content.lower()
+
+        match au.method:
+            case AutoResponseMethod.exact if not au.data.regex:
+                matched = text == trigger
+            case AutoResponseMethod.contains if not au.data.regex:
+                end = len(trigger)
+                matched = any(
+                    text[start:start+end] == trigger and
+                    (start == 0 or text[start-1].isspace()) and
+                    (start+end == len(text) or text[start+end].isspace())
+                    for start in range(len(text))
+                )
+            case AutoResponseMethod.mention:
+                matched = au.trigger in MENTION_PATTERN.findall(content)
+            case AutoResponseMethod.disabled:
+                matched = False
+            case _:
+                source = {
+                    AutoResponseMethod.exact: rf'\A(?:{au.trigger})\Z',
+                    AutoResponseMethod.contains: rf'(?<!\S)(?:{au.trigger})(?!\S)'
+                }.get(au.method, au.trigger)
+
+                try:
+                    matched = compile(source, flags).search(content) is not None
+                except RegexError:
+                    matched = False
+
+        if matched:
+            matches.add(au.id)
+
+    return matches
+
+
+@pytest.mark.parametrize(('pattern', 'literal'), [
+    ('hello world', 'hello world'),
+    ('ab+c', 'ab'),
+    ('a{2}bc', 'bc'),
+    ('abc|def', None),
+    (r'\.com', '.com'),
+    ('foo(bar)baz', 'foo'),
+    ('([)]abc)?xyz', 'xyz'),
+    ('(a[)]bcd)?xyz', 'xyz'),
+    ('(}abc)?xyz', 'xyz'),
+    ('[]a]bc', 'bc'),
+    ('[^]a]bc', 'bc'),
+    ('x[a|b]yz', 'yz'),
+    ('café', 'caf')
+])
+def test_required_literal(pattern, literal):
+    assert required_literal(pattern) == literal
+
+
+ATOMS = ['a', 'b', 'c', 'x', 'i', 's', ' ', '.', r'\d', r'\.', '[)]', '[]a]', '[^b]', '(', ')', '|', '?', '*', '+', '{2}', '{1,}', '}', '{', 'ı', 'ſ']
+TEXT = 'abcxis .)]1İıſABC'
+
+
+def random_pattern(rng: Random) -> str:
+    return ''.join(rng.choice(ATOMS) for _ in range(rng.randint(1, 8)))
+
+
+def random_text(rng: Random) -> str:
+    return ''.join(rng.choice(TEXT) for _ in range(rng.randint(0, 12)))
+
+
+@pytest.mark.parametrize('flags', [0, IGNORECASE])
+def test_required_literal_is_never_wrong(flags):
+    rng = Random(18)
+    checked = 0
+
+    for _ in range(3000):
+        pattern = random_pattern(rng)
+
+        try:
+            compiled = compile(pattern, flags)
+        except RegexError:
+            continue
+
+        if (literal := required_literal(pattern, compiled.flags)) is None:
+            continue
+
+        for _ in range(50):
+            text = random_text(rng)
+
+            if compiled.search(text):
+                checked += 1
+                assert literal.lower() in fold_case(text), (pattern, text)
+
+    assert checked > 1000
+
+
+def test_matcher_agrees_with_naive_matching():
+    rng = Random(21)
+    words = ['hi', 'Hi', 'hello there', 'a', 'ab', 'abc', 'x.y', '<@123>', '123', 'i', 'ı']
+    methods = list(AutoResponseMethod)
+    auto_responses = []
+
+    for index in range(300):
+        method = rng.choice(methods)
+        regex = rng.random() < 0.4
+
+        if method == AutoResponseMethod.mention:
+            trigger = rng.choice(['123', '456'])
+        elif method == AutoResponseMethod.regex or regex:
+            trigger = random_pattern(rng)
+        else:
+            trigger = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 2)))
+
+        auto_responses.append(auto_response(
+            str(index), method, trigger,
+            regex=regex,
+            case_sensitive=rng.random() < 0.3
+        ))
+
+    matcher = AutoResponseMatcher(auto_responses)
+
+    for _ in range(500):
+        content = ' '.join(
+            rng.choice(words+[random_text(rng)])
+            for _ in range(rng.randint(0, 4))
+        )
+
+        assert matcher.match(content) == naive_match(auto_responses, content), content
+
+
+def test_patched_matcher_agrees_with_rebuilt_matcher():
+    hello = auto_response('1', AutoResponseMethod.contains, 'hello')
+    matcher = AutoResponseMatcher([hello, auto_response('2', AutoResponseMethod.regex, 'ab+c')])
+    assert matcher.match('hello abbc') == {'1', '2'}
+
+    matcher.patch([auto_response('1', AutoResponseMethod.exact, 'goodbye')], deleted=['2'])
+    assert matcher.match('hello abbc') == set()
+    assert matcher.match('Goodbye') == {'1'}
+
+
+def test_matchers_patch_effective_versions():
+    hello = auto_response('g1', AutoResponseMethod.contains, 'hello')
+    excluded, overridden, rebuilt = [], [hello], [hello]
+    matchers = AutoResponseMatchers()
+    matchers.get(1, lambda: excluded, lambda au: None)
+    matchers.get(2, lambda: overridden, lambda au: au.model_copy(update={'trigger': 'goodbye'}))
+    matchers.get(3, lambda: rebuilt)
+
+    rebuilt = [auto_response('g1', AutoResponseMethod.contains, 'rebuilt')]
+    matchers.patch([hello])
+
+    assert matchers.get(1, lambda: []).match('hello') == set()
+    assert matchers.get(2, lambda: []).match('hello') == set()
+    assert matchers.get(2, lambda: []).match('goodbye') == {'g1'}
+    # ? matchers without an effective callback are compiled again
+    assert matchers.get(3, lambda: rebuilt).match('rebuilt') == {'g1'}
+
+
+def test_failed_reload_fetch_is_retried():
+    async def main():
+        hello = auto_response('g1', AutoResponseMethod.contains, 'hello')
+        changed = auto_response('g1', AutoResponseMethod.contains, 'goodbye')
+        matchers = AutoResponseMatchers()
+        matchers.get(1, lambda: [hello], lambda au: au)
+        fetches = []
+
+        async def fetch(ids: list[str]) -> list[AutoResponse]:
+            fetches.append(ids)
+
+            if len(fetches) == 1:
+                raise ConnectionError('lost connection')
+
+            return [changed]
+
+        reloader = AutoResponseReloader(matchers, fetch, delay=0.01)
+        reloader.request(changed=['g1'])
+        await sleep(0.05)
+        return fetches, type(reloader.last_error), matchers.get(1, lambda: []).match('goodbye'), reloader._task
+
+    assert run(main()) == ([['g1'], ['g1']], ConnectionError, {'g1'}, None)
+
+
+def test_requests_made_during_a_failed_fetch_win():
+    async def main():
+        reloader = AutoResponseReloader(AutoResponseMatchers(), None)
+
+        async def fetch(ids: list[str]) -> list[AutoResponse]:
+            reloader.request(deleted=['a'])
+            raise ConnectionError('lost connection')
+
+        reloader.fetch = fetch
+        reloader._upserts = {'a', 'b'}
+
+        with pytest.raises(ConnectionError):
+            await reloader.apply()
+
+        reloader.close()
+        return reloader._upserts, reloader._deleted
+
+    assert run(main()) == ({'b'}, {'a'})
+
+
+def reroll_select(auto_responses: list[AutoResponse], rng: Random) -> AutoResponse:
+    """the selection AutoResponseSelector replaces, pick by weight, roll chance, reroll on failure"""
+    weights = [au.data.weight for au in auto_responses]
+
+    while True:
+        au = rng.choices(auto_responses, weights)[0]
+
+        if rng.random()*100 < au.data.chance:
+            return au
+
+
+def chi_square(counts: dict[str, int], expected: dict[str, float]) -> float:
+    total = sum(counts.values())
+    return sum(
+        (counts.get(_id, 0)-probability*total)**2/(probability*total)
+        for _id, probability in expected.items()
+    )
+
+
+# ? 99.9th percentile of the chi-square distribution with 4 degrees of freedom
+CHI_SQUARE_CRITICAL = 18.467
+
+
+def test_selection_distribution_matches_rerolling():
+    auto_responses = [
+        auto_response(str(index), AutoResponseMethod.contains, 'hi', weight=weight, chance=chance)
+        for index, (weight, chance) in enumerate([(1000, 100), (1000, 50), (2000, 5), (500, 20), (3000, 1), (0, 50)])
+    ]
+    products = {au.id: au.data.weight*au.data.chance for au in auto_responses}
+    expected = {_id: product/sum(products.values()) for _id, product in products.items() if product}
+    selector, rng, draws = AutoResponseSelector(), Random(21), 50_000
+
+    selected, rerolled = {}, {}
+
+    for _ in range(draws):
+        _id = selector.select(auto_responses, rng).id
+        selected[_id] = selected.get(_id, 0)+1
+        _id = reroll_select(auto_responses, rng).id
+        rerolled[_id] = rerolled.get(_id, 0)+1
+
+    assert '5' not in selected
+    assert chi_square(selected, expected) < CHI_SQUARE_CRITICAL
+    assert chi_square(rerolled, expected) < CHI_SQUARE_CRITICAL
+
+
+def test_selection_follows_overridden_weights():
+    selector, rng = AutoResponseSelector(), Random(21)
+    first, second = (auto_response(_id, AutoResponseMethod.contains, 'hi') for _id in ('1', '2'))
+    assert {selector.select([first, second], rng).id for _ in range(100)} == {'1', '2'}
+
+    overridden = first.model_copy(update={'data': first.data.model_copy(update={'weight': 0})})
+    assert {selector.select([overridden, second], rng).id for _ in range(100)} == {'2'}
+    assert selector.select([overridden], rng) is None
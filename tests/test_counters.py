@@ -0,0 +1,129 @@
+from pymongo.errors import AutoReconnect, BulkWriteError
+from utils.db.counters import CounterAggregator
+from asyncio import run, sleep
+
+
+class FakeCollection:
+    def __init__(
+        self,
+        delay: float = 0.0,
+        fail: set[int] | None = None,
+        code: int = 91,
+        permanent: bool = False,
+        error: Exception | None = None
+    ) -> None:
+        """fails the ids in fail with code once, or on every write if permanent"""
+        self.delay = delay
+        self.fail = fail or set()
+        self.code = code
+        self.permanent = permanent
+        self.error = error
+        self.totals: dict[int, int] = {}
+
+    async def bulk_write(self, operations: list, ordered: bool) -> None:
+        await sleep(self.delay)
+
+        if (error := self.error) is not None:
+            self.error = None
+            raise error
+
+        errors = []
+
+        for index, operation in enumerate(operations):
+            _id = operation._filter['_id']
+
+            if _id in self.fail:
+                errors.append({'index': index, 'code': self.code, 'errmsg': 'failed'})
+                continue
+
+            for amount in operation._doc['$inc'].values():
+                self.totals[_id] = self.totals.get(_id, 0)+amount
+
+        if not self.permanent:
+            self.fail = set()
+
+        if errors:
+            raise BulkWriteError({'writeErrors': errors})
+
+
+def fake_document(collection: FakeCollection) -> type:
+    class Document:
+        @staticmethod
+        def get_motor_collection() -> FakeCollection:
+            return collection
+
+    return Document
+
+
+def test_close_finishes_running_flush():
+    async def main():
+        collection = FakeCollection(delay=0.05)
+        document = fake_document(collection)
+        counters = CounterAggregator(max_delay=0.01)
+        counters.start()
+        counters.increment(document, 1, 'count', 5)
+        await sleep(0.03)  # ? the flush loop is now waiting on bulk_write
+        await counters.close()
+        return collection.totals
+
+    assert run(main()) == {1: 5}
+
+
+def test_transient_write_errors_requeue_failed_ids_only():
+    async def main():
+        collection = FakeCollection(fail={2})
+        document = fake_document(collection)
+        counters = CounterAggregator()
+
+        for _id in (1, 2, 3):
+            counters.increment(document, _id, 'count', _id)
+
+        await counters.flush()
+        requeued = {_id: counters.pending(document, _id, 'count') for _id in (1, 2, 3)}
+        await counters.flush()
+        return requeued, collection.totals, counters.dropped
+
+    requeued, totals, dropped = run(main())
+    assert requeued == {1: 0, 2: 2, 3: 0}
+    assert totals == {1: 1, 2: 2, 3: 3}
+    assert dropped == 0
+
+
+def test_connection_errors_requeue_the_collection():
+    async def main():
+        collection = FakeCollection(error=AutoReconnect('connection reset'))
+        document = fake_document(collection)
+        counters = CounterAggregator()
+        counters.increment(document, 1, 'count', 4)
+        await counters.flush()
+        requeued = counters.pending(document, 1, 'count')
+        await counters.flush()
+        return requeued, collection.totals
+
+    assert run(main()) == (4, {1: 4})
+
+
+def test_permanent_write_errors_dont_block_other_collections():
+    async def main():
+        failing = FakeCollection(fail={1}, code=14, permanent=True)  # ? TypeMismatch, $inc of a string
+        healthy = FakeCollection()
+        failing_document, healthy_document = fake_document(failing), fake_document(healthy)
+        counters = CounterAggregator(max_delay=0.01)
+        counters.start()
+
+        for _ in range(3):
+            counters.increment(failing_document, 1, 'count')
+            counters.increment(failing_document, 2, 'count')
+            counters.increment(healthy_document, 1, 'count')
+            await sleep(0.02)
+
+        await counters.close()
+        return (
+            failing.totals,
+            healthy.totals,
+            counters.pending(failing_document, 1, 'count'),
+            counters.pending(healthy_document, 1, 'count'),
+            counters.dropped
+        )
+
+    assert run(main()) == ({2: 3}, {1: 3}, 0, 0, 3)
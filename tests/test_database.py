@@ -0,0 +1,207 @@
+from utils.db.documents.ext.revision import revision_of
+from asyncio import CancelledError, create_task, run, sleep
+from utils.db import AutoResponse, AutoResponseMethod, AutoResponseType, Guild, Log, User
+from beanie.exceptions import StateNotSaved
+from utils.tyrantlib import merge_dicts
+from mongo import database
+import pytest
+
+
+def test_cached_documents_are_not_shared(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            await mongo.guild(1, create_if_not_found=True)
+            first, second = await mongo.guild(1), await mongo.guild(1)
+            assert first is not second
+            assert mongo.cache.hits >= 2
+
+            first.name = 'unsaved'
+            assert (await mongo.guild(1)).name == ''
+            # ? copies of one cached document keep the revision compiled caches are keyed by
+            assert revision_of(first) == revision_of(second)
+
+            await second.save_changes()
+            assert (await mongo.guild(1, ignore_cache=True)).name == ''
+
+    run(main())
+
+
+def test_coalesced_lookups_get_their_own_instance(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            await User(id=1, username='one').insert()
+            users = await mongo.users_many([1, 1])
+            assert users[1] is not await mongo.user(1)
+
+    run(main())
+
+
+def test_misses_are_remembered(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            assert await mongo.user(8) is None
+            # ? written behind the cache's back, no change stream runs here
+            await User.get_motor_collection().insert_one({'_id': 8, 'username': 'eight'})
+            assert await mongo.user(8) is None
+            assert mongo.cache.is_missing(User, 8)
+            assert (await mongo.user(8, ignore_cache=True)).username == 'eight'
+
+    run(main())
+
+
+def test_failed_lookups_are_not_remembered_as_missing(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            await User(id=7, username='seven').insert()
+            collection = User.get_motor_collection()
+            find, find_one = collection.find, collection.find_one
+
+            def failing(*args, **kwargs):
+                raise ConnectionError('lost connection')
+
+            async def failing_one(*args, **kwargs):
+                failing()
+
+            monkeypatch.setattr(collection, 'find', failing)
+            monkeypatch.setattr(collection, 'find_one', failing_one)
+
+            with pytest.raises(ConnectionError):
+                await mongo.user(7)
+
+            with pytest.raises(ConnectionError):
+                await mongo.users_many([7])
+
+            monkeypatch.setattr(collection, 'find', find)
+            monkeypatch.setattr(collection, 'find_one', find_one)
+            assert not mongo.cache.is_missing(User, 7)
+            assert (await mongo.user(7)).username == 'seven'
+
+    run(main())
+
+
+def test_cancelled_lookups_are_not_remembered_as_missing(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            await User(id=7, username='seven').insert()
+            collection = User.get_motor_collection()
+            find_one = collection.find_one
+
+            async def slow(*args, **kwargs):
+                await sleep(0.05)
+                return await find_one(*args, **kwargs)
+
+            monkeypatch.setattr(collection, 'find_one', slow)
+            lookup = create_task(mongo.user(7, ignore_cache=True))
+            await sleep(0.01)
+            lookup.cancel()
+
+            with pytest.raises(CancelledError):
+                await lookup
+
+            assert not mongo.cache.is_missing(User, 7)
+            assert (await mongo.user(7)).username == 'seven'
+
+    run(main())
+
+
+def test_statistics_updates_dont_reload_auto_responses(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            requested = []
+            monkeypatch.setattr(mongo.au_reloader, 'request', lambda **ids: requested.append(ids))
+
+            def update(*fields: str) -> dict:
+                return {
+                    'operationType': 'update',
+                    'documentKey': {'_id': 'au'},
+                    'updateDescription': {'updatedFields': dict.fromkeys(fields, 1), 'removedFields': []}
+                }
+
+            mongo._on_au_change(update('statistics.trigger_count'))
+            mongo._on_au_change(update('statistics.trigger_count', 'trigger'))
+            return requested
+
+    assert run(main()) == [{'changed': ['au']}]
+
+
+@pytest.mark.parametrize('overrides', [
+    {'trigger': 'bye'},
+    {'response': 'hello', 'data': {'chance': 50.0, 'followups': [{'response': 'later'}]}},
+    {'data': {'weight': 5}, 'statistics': {'trigger_count': 3}, 'unknown': 1}
+])
+def test_with_overrides_matches_validating_the_merged_document(monkeypatch, overrides):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            await AutoResponse(id='au', method=AutoResponseMethod.exact, trigger='hi', response='hey', type=AutoResponseType.text).insert()
+            au = await mongo.auto_response('au')
+            expected = au.model_validate(merge_dicts(au.model_dump(), overrides)).model_dump()
+
+            # ? the second call is served from the override cache
+            for _ in range(2):
+                overridden = au.with_overrides(overrides)
+                assert overridden.model_dump() == expected
+
+    run(main())
+
+
+def test_with_overrides_returns_unsaved_copies(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            await AutoResponse(id='au', method=AutoResponseMethod.exact, trigger='hi', response='hey', type=AutoResponseType.text).insert()
+            au = await mongo.auto_response('au')
+            first, second = au.with_overrides({'trigger': 'bye'}), au.with_overrides({'trigger': 'bye'})
+            assert first is not second
+
+            first.statistics.trigger_count += 1
+            first.data.followups.append(AutoResponse.AutoResponseData.AutoResponseFollowup(response='later'))
+            assert au.statistics.trigger_count == second.statistics.trigger_count == 0
+            assert au.data.followups == second.data.followups == []
+
+            with pytest.raises(StateNotSaved):
+                await first.save_changes()
+
+            assert (await AutoResponse.get_motor_collection().find_one({'_id': 'au'}))['trigger'] == 'hi'
+
+    run(main())
+
+
+def test_close_continues_after_a_failing_close(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            async def failing():
+                raise RuntimeError('counters failed')
+
+            monkeypatch.setattr(mongo.counters, 'close', failing)
+            await mongo.log_ingestor.put(mongo.new.log(1, {}))
+
+            with pytest.raises(RuntimeError):
+                await mongo.close()
+
+            monkeypatch.setattr(mongo.counters, 'close', lambda: sleep(0))
+            return await Log.get_motor_collection().count_documents({})
+
+    assert run(main()) == 1
+
+
+def test_views_are_not_shared(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            guild = await mongo.guild(1, create_if_not_found=True)
+            guild.data.permissions['10'] = ['logging.*']
+            await guild.save_changes()
+            # ? guild 2 has no permissions stored, its view gets the model default
+            await Guild.get_motor_collection().insert_one({'_id': 2, 'name': '', 'owner': None})
+
+            view = await mongo.guild_view(1, 'data.permissions')
+            view['data.permissions']['10'].append('admin')
+            defaulted = await mongo.guild_view(2, 'data.permissions')
+            defaulted['data.permissions']['20'] = ['admin']
+
+            return (
+                (await mongo.guild_view(1, 'data.permissions'))['data.permissions'],
+                (await mongo.guild_view(2, 'data.permissions'))['data.permissions'],
+                (await mongo.guild_view(3, 'data.permissions', ignore_cache=True)),
+                mongo.cache.hits
+            )
+
+    assert run(main()) == ({'@everyone': [], '10': ['logging.*']}, {'@everyone': []}, None, 2)
@@ -0,0 +1,161 @@
+from asyncio import CancelledError, create_task, get_running_loop, run, sleep, wait_for
+from pymongo.errors import AutoReconnect, BulkWriteError
+from utils.db.logs import LogIngestor
+from gc import collect
+from utils.db import Log
+from mongo import database
+import pytest
+
+
+def test_close_finishes_running_flush(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            collection = Log.get_motor_collection()
+            insert_many = collection.insert_many
+
+            async def slow(*args, **kwargs):
+                await sleep(0.05)
+                return await insert_many(*args, **kwargs)
+
+            monkeypatch.setattr(collection, 'insert_many', slow)
+            ingestor = LogIngestor(max_delay=0.01)
+            ingestor.start()
+
+            for _id in range(10):
+                await ingestor.put(mongo.new.log(_id, {}))
+
+            await sleep(0.03)  # ? the flush loop is now waiting on insert_many
+            await ingestor.close()
+            return await collection.count_documents({}), ingestor.depth
+
+    assert run(main()) == (10, 0)
+
+
+def test_duplicates_are_skipped(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            await mongo.new.log(3, {'first': True}).insert()
+            ingestor = LogIngestor()
+
+            for _id in range(6):
+                await ingestor.put(mongo.new.log(_id, {}))
+
+            await ingestor.close()
+            return (
+                await Log.get_motor_collection().count_documents({}),
+                (await Log.get_motor_collection().find_one({'_id': 3}))['data'],
+                ingestor.inserted
+            )
+
+    assert run(main()) == (6, {'first': True}, 5)
+
+
+def test_cancelled_flush_requeues(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            collection = Log.get_motor_collection()
+
+            async def hanging(*args, **kwargs):
+                await sleep(60)
+
+            monkeypatch.setattr(collection, 'insert_many', hanging)
+            ingestor = LogIngestor()
+
+            for _id in range(5):
+                await ingestor.put(mongo.new.log(_id, {}))
+
+            flush = create_task(ingestor.flush())
+            await sleep(0.01)
+            flush.cancel()
+
+            with pytest.raises(CancelledError):
+                await flush
+
+            return [log.id for log in ingestor._queue]
+
+    assert run(main()) == [0, 1, 2, 3, 4]
+
+
+def failing_insert_many(monkeypatch, fail: set[int], error: Exception | None = None):
+    """makes inserts of the logs in fail raise the way the server does, or error before writing anything"""
+    collection = Log.get_motor_collection()
+    insert_many = collection.insert_many
+
+    async def insert(documents, *args, **kwargs):
+        documents = list(documents)
+
+        if error is not None:
+            raise error
+
+        for index, document in enumerate(documents):
+            if document['_id'] in fail:
+                if index:
+                    await insert_many(documents[:index], *args, **kwargs)
+
+                raise BulkWriteError({'writeErrors': [{'index': index, 'code': 10334, 'errmsg': 'BSONObjectTooLarge'}]})
+
+        return await insert_many(documents, *args, **kwargs)
+
+    monkeypatch.setattr(collection, 'insert_many', insert)
+    return collection
+
+
+def test_permanently_failing_logs_are_dropped(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            collection = failing_insert_many(monkeypatch, fail={0})
+            ingestor = LogIngestor(max_batch=5, max_queue=5, max_delay=0.01, recent=mongo.recent_messages)
+            ingestor.start()
+
+            # ? with the block policy put() waits for space, a log that can't be written must not hold it forever
+            for _id in range(20):
+                await wait_for(ingestor.put(mongo.new.log(_id, {})), 1)
+
+            await ingestor.close()
+            return (
+                await collection.count_documents({}),
+                ingestor.stats()['failed'],
+                ingestor.depth,
+                mongo.recent_messages.get(0)
+            )
+
+    assert run(main()) == (19, 1, 0, None)
+
+
+def test_transient_failures_are_retried_a_limited_number_of_times(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            failing_insert_many(monkeypatch, fail=set(), error=AutoReconnect('connection reset'))
+            ingestor = LogIngestor(max_retries=2)
+
+            for _id in range(3):
+                await ingestor.put(mongo.new.log(_id, {}))
+
+            for _ in range(2):
+                with pytest.raises(AutoReconnect):
+                    await ingestor.flush()
+
+            retried = ingestor.depth
+            await ingestor.close()
+            return retried, ingestor.depth, ingestor.failed, ingestor.inserted
+
+    assert run(main()) == (3, 0, 3, 0)
+
+
+def test_scheduled_flush_errors_are_retrieved(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            unretrieved = []
+            get_running_loop().set_exception_handler(lambda loop, context: unretrieved.append(context))
+            failing_insert_many(monkeypatch, fail=set(), error=AutoReconnect('connection reset'))
+            ingestor = LogIngestor(max_batch=2)
+
+            for _id in range(2):
+                await ingestor.put(mongo.new.log(_id, {}))
+
+            await sleep(0.01)
+            ingestor._flush_task = None
+            collect()
+            return unretrieved, ingestor.depth
+
+    assert run(main()) == ([], 2)
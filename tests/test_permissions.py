@@ -0,0 +1,92 @@
+from utils.db.documents.ext.flags import UserFlags
+from utils.db.permissions import PermissionResolver
+from asyncio import run
+from mongo import database
+
+
+PERMISSIONS = {
+    '@everyone': ['tts.use'],
+    '10': ['logging.view'],
+    '11': ['auto_responses.custom'],
+    '1000': ['qotd.ask']
+}
+
+
+def check(guild, user_id: int, role_ids: list[int], permission: str, **kwargs) -> bool:
+    return PermissionResolver().check(guild, user_id, role_ids, permission, **kwargs)
+
+
+async def guild(mongo, permissions: dict[str, list[str]] = PERMISSIONS):
+    guild = await mongo.guild(1, create_if_not_found=True)
+    guild.data.permissions = {_id: list(names) for _id, names in permissions.items()}
+    return guild
+
+
+def test_roles_are_combined(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            permissions = await guild(mongo)
+            return [
+                check(permissions, 1, [10, 11], 'logging.view'),
+                check(permissions, 1, [10, 11], 'auto_responses.custom'),
+                check(permissions, 1, [11], 'logging.view'),
+                check(permissions, 1, [12], 'logging.view')
+            ]
+
+    assert run(main()) == [True, True, False, False]
+
+
+def test_everyone_and_user_ids(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            permissions = await guild(mongo)
+            return [
+                check(permissions, 1, [], 'tts.use'),
+                check(permissions, 1000, [], 'qotd.ask'),
+                check(permissions, 1001, [], 'qotd.ask'),
+                # ? only exact permission names are granted
+                check(permissions, 1, [10], 'logging'),
+                check(permissions, 1, [10], 'logging.view.all'),
+                check(permissions, 1, [10], 'unknown')
+            ]
+
+    assert run(main()) == [True, True, False, False, False, False]
+
+
+def test_admins_and_devs_bypass(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            permissions = await guild(mongo)
+            return [
+                check(permissions, 1, [], 'logging.view', user_flags=UserFlags.ADMIN),
+                check(permissions, 1, [], 'logging.view', user_flags=UserFlags.UNLIMITED_TTS),
+                check(permissions, 1, [], 'logging.view', dev=True, dev_bypass=True),
+                check(permissions, 1, [], 'logging.view', dev=True),
+                check(permissions, 1, [], 'logging.view', dev_bypass=True)
+            ]
+
+    assert run(main()) == [True, False, True, False, False]
+
+
+def test_guilds_are_compiled_again_after_a_save(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            resolver = PermissionResolver()
+            permissions = await guild(mongo)
+            compiled = resolver.compiled(permissions)
+            before = resolver.check(permissions, 1, [10], 'qotd.ask')
+
+            permissions.data.permissions['10'].append('qotd.ask')
+            # ? unsaved changes keep the compiled permissions of the revision
+            unsaved = resolver.check(permissions, 1, [10], 'qotd.ask')
+            await permissions.save_changes()
+
+            return (
+                before,
+                unsaved,
+                resolver.check(permissions, 1, [10], 'qotd.ask'),
+                resolver.compiled(await mongo.guild(1)) is resolver.compiled(await mongo.guild(1)),
+                resolver.compiled(permissions) is compiled
+            )
+
+    assert run(main()) == (False, False, True, True, False)
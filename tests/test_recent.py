@@ -0,0 +1,74 @@
+from utils.db.logs import LogIngestor, OverflowPolicy
+from utils.db.recent import RecentMessages
+from asyncio import run
+from utils.db import Log
+from mongo import database
+
+
+def log(_id: int, guild: int | None = 1, data: dict | None = None) -> Log:
+    # ? constructed without validation, documents can't be validated before beanie is initialized
+    return Log.model_construct(id=_id, guild=guild, data=data or {})
+
+
+def test_guilds_keep_their_latest_logs():
+    recent = RecentMessages(per_guild=2)
+
+    for _id in range(4):
+        recent.add(log(_id, guild=1))
+
+    recent.add(log(10, guild=2))
+    assert [recent.get(_id) is not None for _id in (0, 1, 2, 3, 10)] == [False, False, True, True, True]
+    assert len(recent) == 3
+
+
+def test_oldest_logs_of_any_guild_are_dropped_over_max_bytes():
+    size = len(log(0).model_dump_json())
+    recent = RecentMessages(max_bytes=size*3)
+
+    for _id, guild in enumerate((1, 2, 1, 2)):
+        recent.add(log(_id, guild=guild))
+
+    assert recent.get(0) is None
+    assert [recent.get(_id).id for _id in (1, 2, 3)] == [1, 2, 3]
+    assert recent.bytes == size*3
+
+    recent.add(log(4, data={'content': 'x'*size*3}))
+    assert recent.get(4) is None
+    assert recent.bytes == size*3
+
+
+def test_logs_are_copied():
+    recent = RecentMessages()
+    original = log(1, data={'content': 'hello'})
+    recent.add(original)
+
+    recent.get(1).data['deleted'] = True
+    assert recent.get(1).data == original.data == {'content': 'hello'}
+
+
+def test_changed_and_deleted_logs_are_discarded(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            for _id in range(3):
+                mongo.recent_messages.add(mongo.new.log(_id, {}, guild=1))
+
+            for _id, operation in enumerate(('insert', 'update', 'delete')):
+                mongo._on_log_change({'operationType': operation, 'documentKey': {'_id': _id}})
+
+            return [mongo.recent_messages.get(_id) is not None for _id in range(3)]
+
+    assert run(main()) == [True, False, False]
+
+
+def test_dropped_logs_are_discarded(monkeypatch):
+    async def main():
+        async with database(monkeypatch) as mongo:
+            recent = RecentMessages()
+            ingestor = LogIngestor(max_queue=2, policy=OverflowPolicy.drop_oldest, recent=recent)
+
+            for _id in range(3):
+                await ingestor.put(mongo.new.log(_id, {}))
+
+            return [recent.get(_id) is not None for _id in range(3)], ingestor.dropped
+
+    assert run(main()) == ([False, True, True], 1)
@@ -0,0 +1,32 @@
+from utils.db.tts import DiskTier
+from asyncio import gather, run
+from shutil import rmtree
+
+
+def test_concurrent_disk_puts(tmp_path):
+    async def main():
+        disk = DiskTier(str(tmp_path), 1024*1024)
+        keys = [f'voice:{index}' for index in range(50)]
+
+        await gather(*(
+            disk.put(key, key.encode()*100)
+            for key in keys
+            for _ in range(3)
+        ))
+
+        return disk, keys
+
+    disk, keys = run(main())
+
+    for key in keys:
+        assert bytes(disk.get(key)) == key.encode()*100
+
+    assert not list(tmp_path.glob('*.tmp'))
+    assert disk.bytes == sum(len(key)*100 for key in keys)
+
+
+def test_failed_disk_put_is_ignored(tmp_path):
+    disk = DiskTier(str(tmp_path/'audio'), 1024*1024)
+    rmtree(tmp_path/'audio')
+    run(disk.put('voice', b'audio'))
+    assert disk.get('voice') is None